@@ -6,7 +6,6 @@ import sys
 
 import matplotlib.pyplot as plt
 import pandas as pd
-import pywt
 import seaborn as sns
 
 from constants import ids
@@ -23,7 +22,7 @@ logger.addHandler(logging.StreamHandler(sys.stdout))
 
 # ! Define mother wavelet
 MOTHER = "db4"
-mother_wavelet = pywt.Wavelet(MOTHER)
+mother_wavelet = dwt.load_wavelet(MOTHER)
 
 # * Define constant currency years
 CONSTANT_DOLLAR_DATE = "2017-12-01"
@@ -47,52 +46,80 @@ HYPOTHESIS_THRESHOLD = [0.1, 0.05, 0.001]
 # US data
 
 #  %%
+# * Retrieve all US and French series concurrently
+(
+    raw_cpi,
+    raw_inf,
+    raw_exp,
+    raw_nondur,
+    raw_dur,
+    raw_save,
+    raw_save_rate,
+    raw_fr_cpi,
+    raw_fr_inf,
+    raw_fr_food,
+    raw_fr_goods,
+    raw_fr_dur,
+) = retrieve_data.fetch_all_threaded(
+    [
+        ("fred", ids.US_CPI, {}),
+        ("fred", ids.US_CPI, {"units": "pc1", "freq": "m"}),
+        ("fred", ids.US_INF_EXPECTATIONS, {}),
+        ("fred", ids.US_NONDURABLES_CONSUMPTION, {}),
+        ("fred", ids.US_DURABLES_CONSUMPTION, {}),
+        ("fred", ids.US_SAVINGS, {}),
+        ("fred", ids.US_SAVINGS_RATE, {}),
+        ("fred", ids.FR_CPI, {}),
+        ("fred", ids.FR_CPI, {"units": "pc1", "freq": "m"}),
+        ("insee", ids.FR_FOOD_CONSUMPTION, {}),
+        ("insee", ids.FR_GOODS_CONSUMPTION, {}),
+        ("insee", ids.FR_DURABLES_CONSUMPTION, {}),
+    ]
+)
+
 # * CPI
-raw_data = retrieve_data.get_fed_data(ids.US_CPI)
-cpi, _, _ = retrieve_data.clean_fed_data(raw_data)
+cpi, _, _ = retrieve_data.clean_fed_data(raw_cpi)
 cpi.rename(columns={"value": ids.CPI}, inplace=True)
 
 # * Inflation rate
-raw_data = retrieve_data.get_fed_data(ids.US_CPI, units="pc1", freq="m")
-measured_inf, _, _ = retrieve_data.clean_fed_data(raw_data)
+measured_inf, _, _ = retrieve_data.clean_fed_data(raw_inf)
 measured_inf.rename(columns={"value": ids.INFLATION}, inplace=True)
 
 # * Inflation expectations
-raw_data = retrieve_data.get_fed_data(ids.US_INF_EXPECTATIONS)
-inf_exp, _, _ = retrieve_data.clean_fed_data(raw_data)
+inf_exp, _, _ = retrieve_data.clean_fed_data(raw_exp)
 inf_exp.rename(columns={"value": ids.EXPECTATIONS}, inplace=True)
 
 # * Non-durables consumption, monthly
-raw_data = retrieve_data.get_fed_data(ids.US_NONDURABLES_CONSUMPTION)
-nondur_consump, _, _ = retrieve_data.clean_fed_data(raw_data)
+nondur_consump, _, _ = retrieve_data.clean_fed_data(raw_nondur)
 nondur_consump.rename(columns={"value": ids.NONDURABLES}, inplace=True)
 
 # * Durables consumption, monthly
-raw_data = retrieve_data.get_fed_data(ids.US_DURABLES_CONSUMPTION)
-dur_consump, _, _ = retrieve_data.clean_fed_data(raw_data)
+dur_consump, _, _ = retrieve_data.clean_fed_data(raw_dur)
 dur_consump.rename(columns={"value": ids.DURABLES}, inplace=True)
 
 # * Personal savings
-raw_data = retrieve_data.get_fed_data(ids.US_SAVINGS)
-save, _, _ = retrieve_data.clean_fed_data(raw_data)
+save, _, _ = retrieve_data.clean_fed_data(raw_save)
 save.rename(columns={"value": ids.SAVINGS}, inplace=True)
 
 # * Personal savings rate
-raw_data = retrieve_data.get_fed_data(ids.US_SAVINGS_RATE)
-save_rate, _, _ = retrieve_data.clean_fed_data(raw_data)
+save_rate, _, _ = retrieve_data.clean_fed_data(raw_save_rate)
 save_rate.rename(columns={"value": ids.SAVINGS_RATE}, inplace=True)
 
 # * Merge dataframes to align dates and remove extras
-us_data = cpi.merge(measured_inf, how="left")
-us_data = us_data.merge(inf_exp, how="left")
-us_data = us_data.merge(nondur_consump, how="left")
-us_data = us_data.merge(dur_consump, how="left")
-us_data = us_data.merge(save, how="left")
-us_data = us_data.merge(save_rate, how="left")
+us_data = helpers.combine_series(
+    [cpi, measured_inf, inf_exp, nondur_consump, dur_consump, save, save_rate],
+    how="inner",
+    validate="one_to_one",
+)
 
 # * Remove rows without data for all measures
 us_data.dropna(inplace=True)
 
+# * Cleaned series are float32; run the CPI rebasing and log differences in double
+# * precision, then downcast once the frame is complete
+float_columns = us_data.select_dtypes("float").columns
+us_data[float_columns] = us_data[float_columns].astype("float64")
+
 # * Add real value columns
 logger.info(
     "Using constant dollars from %s, CPI: %s",
@@ -109,6 +136,12 @@ us_data = helpers.calculate_diff_in_log(
     data=us_data,
     columns=[ids.CPI, ids.REAL_NONDURABLES, ids.REAL_DURABLES, ids.REAL_SAVINGS],
 )
+## Log-difference columns, for the correlation matrix
+log_columns = [c for c in us_data.columns if "log" in c]
+
+# * Single precision is enough for all downstream statistics, plots, and wavelets
+float_columns = us_data.select_dtypes("float").columns
+us_data[float_columns] = us_data[float_columns].astype("float32")
 
 usa_sliced = pd.concat([us_data.head(), us_data.tail()])
 usa_sliced
@@ -117,51 +150,50 @@ usa_sliced
 # French data
 # %%
 # * CPI
-raw_data = retrieve_data.get_fed_data(ids.FR_CPI)
-fr_cpi, _, _ = retrieve_data.clean_fed_data(raw_data)
+fr_cpi, _, _ = retrieve_data.clean_fed_data(raw_fr_cpi)
 fr_cpi.rename(columns={"value": ids.CPI}, inplace=True)
 
 # * Measured inflation
-raw_data = retrieve_data.get_fed_data(ids.FR_CPI, units="pc1", freq="m")
-fr_inf, _, _ = retrieve_data.clean_fed_data(raw_data)
+fr_inf, _, _ = retrieve_data.clean_fed_data(raw_fr_inf)
 fr_inf.rename(columns={"value": ids.INFLATION}, inplace=True)
 
 # * Inflation expectations
 _, fr_exp = process_camme.preprocess(process_camme.camme_dir)
 ## Remove random lines with month as letter
-fr_exp = fr_exp[fr_exp["month"].apply(isinstance, args=(int,))]
+fr_exp = fr_exp[pd.to_numeric(fr_exp["month"], errors="coerce").notna()]
 ## Create date column
 fr_exp["date"] = pd.to_datetime(fr_exp[["year", "month"]].assign(DAY=1))
 ## Use just quantitative expectations and date
 fr_exp = fr_exp[["date", "inf_exp_val_inc", "inf_exp_val_dec"]]
 ## Convert to negative for averaging
 fr_exp["inf_exp_val_dec"] = fr_exp["inf_exp_val_dec"] * -1
-## Melt then pivot to get average expectation for each month
-fr_exp_melt = pd.melt(fr_exp, ["date"])
-fr_exp = pd.pivot_table(fr_exp_melt, index="date", aggfunc="mean")
-fr_exp.rename(columns={"value": ids.EXPECTATIONS}, inplace=True)
+## Average all responses (increase and decrease) for each month
+fr_exp = (
+    fr_exp.set_index("date")[["inf_exp_val_inc", "inf_exp_val_dec"]]
+    .stack()
+    .groupby(level=0)
+    .mean()
+    .to_frame(ids.EXPECTATIONS)
+)
 
 # * Food consumption
-raw_data = retrieve_data.get_insee_data(ids.FR_FOOD_CONSUMPTION)
-fr_food_cons, _, _ = retrieve_data.clean_insee_data(raw_data)
+fr_food_cons, _, _ = retrieve_data.clean_insee_data(raw_fr_food)
 fr_food_cons.rename(columns={"value": "food"}, inplace=True)
 
 # * Goods consumption
-raw_data = retrieve_data.get_insee_data(ids.FR_GOODS_CONSUMPTION)
-fr_goods_cons, _, _ = retrieve_data.clean_insee_data(raw_data)
+fr_goods_cons, _, _ = retrieve_data.clean_insee_data(raw_fr_goods)
 fr_goods_cons.rename(columns={"value": "goods"}, inplace=True)
 
 # * Durables consumption
-raw_data = retrieve_data.get_insee_data(ids.FR_DURABLES_CONSUMPTION)
-fr_dur_cons, _, _ = retrieve_data.clean_insee_data(raw_data)
+fr_dur_cons, _, _ = retrieve_data.clean_insee_data(raw_fr_dur)
 fr_dur_cons.rename(columns={"value": "durables"}, inplace=True)
 
 # %%
-fr_data = fr_cpi.merge(fr_inf, how="left")
-fr_data = fr_data.merge(fr_exp.reset_index(), how="left")
-fr_data = fr_data.merge(fr_food_cons, how="left")
-fr_data = fr_data.merge(fr_goods_cons, how="left")
-fr_data = fr_data.merge(fr_dur_cons, how="left")
+fr_data = helpers.combine_series(
+    [fr_cpi, fr_inf, fr_exp.reset_index(), fr_food_cons, fr_goods_cons, fr_dur_cons]
+)
+float_columns = fr_data.select_dtypes("float").columns
+fr_data[float_columns] = fr_data[float_columns].astype("float32")
 
 fr_sliced = pd.concat([fr_data.head(), fr_data.tail()])
 fr_sliced
@@ -184,8 +216,14 @@ inf_data.columns = [
 ]
 
 # %%
-inf_melt = pd.melt(inf_data, ["Date"])
-inf_melt.rename(columns={"value": "Measured (%)"}, inplace=True)
+inf_melt = (
+    inf_data.set_index("Date")
+    .rename_axis(columns="variable")
+    .stack()
+    .reset_index(name="Measured (%)")
+)
+## Partition once by measure for the plots below
+inf_melt_groups = dict(tuple(inf_melt.groupby("variable", sort=False)))
 
 # %% [markdown]
 ##### Figure XX - Time series: Measured Inflation (US and France)
@@ -194,13 +232,13 @@ _, (ax, bx) = plt.subplots(2, 1, sharex=True)
 
 # * US subplot
 measures_to_plot = ["Measured (US)", "Expectations (US)"]
-data = inf_melt[inf_melt["variable"].isin(measures_to_plot)]
+data = pd.concat([inf_melt_groups[m] for m in measures_to_plot])
 ax = sns.lineplot(data=data, x="Date", y="Measured (%)", hue="variable", ax=ax)
 ax.legend().set_title(None)
 
 # * French subplot
 measures_to_plot = ["Measured (France)", "Expectations (France)"]
-data = inf_melt[inf_melt["variable"].isin(measures_to_plot)]
+data = pd.concat([inf_melt_groups[m] for m in measures_to_plot])
 bx = sns.lineplot(data=data, x="Date", y="Measured (%)", hue="variable", ax=bx)
 bx.legend().set_title(None)
 plt.suptitle("Inflation Rates, US and France")
@@ -210,15 +248,20 @@ plt.tight_layout()
 ## Table 1 Descriptive statistics
 
 # %%
-usa_melt = pd.melt(us_data, ["date"])
-usa_melt.rename(columns={"value": "Billions ($)"}, inplace=True)
+usa_melt = (
+    us_data.set_index("date")
+    .rename_axis(columns="variable")
+    .stack()
+    .reset_index(name="Billions ($)")
+)
+usa_melt_groups = dict(tuple(usa_melt.groupby("variable", sort=False)))
 
 # %% [markdown]
 ##### Figure 2 - Time series: Inflation Expectations, Nondurables Consumption, Durables Consumption, and Savings (US)
 # %%
 _, (bx) = plt.subplots(1, 1)
 measures_to_plot = [ids.NONDURABLES, ids.DURABLES]
-data = usa_melt[usa_melt["variable"].isin(measures_to_plot)]
+data = pd.concat([usa_melt_groups[m] for m in measures_to_plot])
 bx = sns.lineplot(data=data, x="date", y="Billions ($)", hue="variable", ax=bx)
 plt.title("Real consumption levels, United States (2017 dollars)")
 
@@ -232,7 +275,7 @@ plot_columns = [
     ids.DIFF_LOG_REAL_DURABLES,
     ids.DIFF_LOG_REAL_SAVINGS,
 ]
-sns.pairplot(us_data[plot_columns], corner=True, kind="reg", plot_kws={"ci": None})
+regression.plot_pairs(us_data[plot_columns])
 
 # %% [markdown]
 ##### Table 1: Descriptive statistics
@@ -246,7 +289,7 @@ descriptive_statistics_results
 ##### Table XX: Correlation matrix
 # %%
 us_corr = descriptive_stats.correlation_matrix_pvalues(
-    data=us_data[[c for c in us_data.columns if "log" in c]],
+    data=us_data[log_columns],
     hypothesis_threshold=HYPOTHESIS_THRESHOLD,
     decimals=2,
     display=False,
@@ -257,19 +300,24 @@ us_corr
 # %% [markdown]
 ##### Figure XX - Time series: Inflation Expectations, Food Consumption, Durables Consumption (France)
 # %%
-fr_melt = pd.melt(fr_data, ["date"])
-fr_melt.rename(columns={"value": "Billions (€)"}, inplace=True)
+fr_melt = (
+    fr_data.set_index("date")
+    .rename_axis(columns="variable")
+    .stack()
+    .reset_index(name="Billions (€)")
+)
+fr_melt_groups = dict(tuple(fr_melt.groupby("variable", sort=False)))
 
 fig, (ax, bx) = plt.subplots(1, 2)
 measures_to_plot = ["food", "durables"]
-data = fr_melt[fr_melt["variable"].isin(measures_to_plot)]
+data = pd.concat([fr_melt_groups[m] for m in measures_to_plot])
 ax = sns.lineplot(data=data, x="date", y="Billions (€)", hue="variable", ax=ax)
 plt.title("Consumption levels, France")
 
 # %% [markdown]
 ##### Figure XX - Distribution of Inflation Expectations, Nondurables Consumption, Durables Consumption (France)
 # %%
-sns.pairplot(fr_data, corner=True, kind="reg", plot_kws={"ci": None})
+regression.plot_pairs(fr_data)
 
 # %% [markdown]
 ##### Table 1: Descriptive statistics
@@ -283,17 +331,23 @@ fr_data.describe()
 ### 3.2.1) Time scale decomposition
 
 # %%
-# * Create data objects for each measure
-exp_for_dwt = dwt.DataForDWT(us_data[ids.EXPECTATIONS].to_numpy(), mother_wavelet)
-nondur_for_dwt = dwt.DataForDWT(us_data[ids.NONDURABLES].to_numpy(), mother_wavelet)
-dur_for_dwt = dwt.DataForDWT(us_data[ids.DURABLES].to_numpy(), mother_wavelet)
-save_for_dwt = dwt.DataForDWT(us_data[ids.SAVINGS].to_numpy(), mother_wavelet)
-
-# * Run DWTs and extract smooth signals
-results_exp_dwt = dwt.smooth_signal(exp_for_dwt)
-results_nondur_dwt = dwt.smooth_signal(nondur_for_dwt)
-results_dur_dwt = dwt.smooth_signal(dur_for_dwt)
-results_save_dwt = dwt.smooth_signal(save_for_dwt)
+# * Run DWTs (all series in one stacked transform) and extract smooth signals
+results_us_dwt = dwt.smooth_signal(
+    dwt.DataForDWT(
+        us_data[[ids.EXPECTATIONS, ids.NONDURABLES, ids.DURABLES, ids.SAVINGS]]
+        .to_numpy()
+        .T,
+        mother_wavelet,
+    )
+)
+results_exp_dwt, results_nondur_dwt, results_dur_dwt, results_save_dwt = (
+    dwt.select_series(results_us_dwt, i) for i in range(4)
+)
+exp_coeffs, exp_levels, exp_smooth = (
+    results_exp_dwt.coeffs,
+    results_exp_dwt.levels,
+    results_exp_dwt.smoothed_signals,
+)
 
 # * Numpy array for date
 t = us_data["date"].to_numpy()
@@ -305,10 +359,10 @@ t = us_data["date"].to_numpy()
 _ = regression.plot_compare_components(
     a_label=ids.EXPECTATIONS,
     b_label=ids.NONDURABLES,
-    smooth_a_coeffs=results_exp_dwt.coeffs,
+    smooth_a_coeffs=exp_coeffs,
     smooth_b_coeffs=results_nondur_dwt.coeffs,
     time=t,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     wavelet=MOTHER,
     figsize=(15, 10),
 )
@@ -319,10 +373,10 @@ _ = regression.plot_compare_components(
 _ = regression.plot_compare_components(
     a_label=ids.EXPECTATIONS,
     b_label=ids.DURABLES,
-    smooth_a_coeffs=results_exp_dwt.coeffs,
+    smooth_a_coeffs=exp_coeffs,
     smooth_b_coeffs=results_dur_dwt.coeffs,
     time=t,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     wavelet=MOTHER,
     figsize=(15, 10),
 )
@@ -333,10 +387,10 @@ _ = regression.plot_compare_components(
 _ = regression.plot_compare_components(
     a_label=ids.EXPECTATIONS,
     b_label=ids.SAVINGS,
-    smooth_a_coeffs=results_exp_dwt.coeffs,
+    smooth_a_coeffs=exp_coeffs,
     smooth_b_coeffs=results_save_dwt.coeffs,
     time=t,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     wavelet=MOTHER,
     figsize=(15, 10),
 )
@@ -377,14 +431,14 @@ results_dur.summary()
 # Figure 12 - Wavelet Smoothing of Inflation Expectations (US)
 
 # %%
-fig, title = dwt.plot_smoothing(
-    results_exp_dwt.smoothed_signal_dict,
+fig = dwt.plot_smoothing(
+    exp_smooth,
     t,
-    exp_for_dwt.y_values,
+    us_data[ids.EXPECTATIONS].to_numpy(),
     figsize=(10, 10),
 )
 plt.xlabel("Year")
-plt.ylabel(f"{title.capitalize()}")
+plt.ylabel("Inflation expectations")
 fig.tight_layout()
 plt.show()
 
@@ -399,14 +453,19 @@ plt.show()
 # simple regression.
 
 # %%
-approximations = regression.wavelet_approximation(
-    smooth_t_dict=results_exp_dwt.smoothed_signal_dict,
-    original_y=nondur_for_dwt.y_values,
-    levels=results_exp_dwt.levels,
+# * Regress all consumption measures on the same smoothed expectations at once
+approximations = regression.wavelet_approximation_multi(
+    smooth_signals=exp_smooth,
+    original_ys={
+        ids.NONDURABLES: us_data[ids.NONDURABLES].to_numpy(),
+        ids.DURABLES: us_data[ids.DURABLES].to_numpy(),
+        ids.SAVINGS: us_data[ids.SAVINGS].to_numpy(),
+    },
+    levels=exp_levels,
 )
 
 # * Remove D_1 and D_2
-apprx = approximations[2]
+apprx = approximations[ids.NONDURABLES][2]
 apprx.summary()
 
 # %% [markdown]
@@ -419,14 +478,8 @@ apprx.summary()
 # as well. Again, we cannot reject the null hypothesis (Table 6).
 
 # %%
-approximations = regression.wavelet_approximation(
-    smooth_t_dict=results_exp_dwt.smoothed_signal_dict,
-    original_y=dur_for_dwt.y_values,
-    levels=results_exp_dwt.levels,
-)
-
 # * Remove D_1 and D_2
-apprx = approximations[2]
+apprx = approximations[ids.DURABLES][2]
 apprx.summary()
 
 # %% [markdown]
@@ -435,7 +488,7 @@ apprx.summary()
 
 # %%
 # * Remove D_1 through D_5
-apprx = approximations[5]
+apprx = approximations[ids.DURABLES][5]
 apprx.summary()
 
 # %% [markdown]
@@ -443,14 +496,8 @@ apprx.summary()
 # Savings (US) <br><br>
 
 # %%
-approximations = regression.wavelet_approximation(
-    smooth_t_dict=results_exp_dwt.smoothed_signal_dict,
-    original_y=save_for_dwt.y_values,
-    levels=results_exp_dwt.levels,
-)
-
 # * Remove D_1 and D_2
-apprx = approximations[2]
+apprx = approximations[ids.SAVINGS][2]
 apprx.summary()
 
 
@@ -461,9 +508,9 @@ apprx.summary()
 
 # %%
 time_scale_results = regression.time_scale_regression(
-    input_coeffs=results_exp_dwt.coeffs,
+    input_coeffs=exp_coeffs,
     output_coeffs=results_nondur_dwt.coeffs,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     mother_wavelet=MOTHER,
 )
 time_scale_results
@@ -474,9 +521,9 @@ time_scale_results
 
 # %%
 time_scale_results = regression.time_scale_regression(
-    input_coeffs=results_exp_dwt.coeffs,
+    input_coeffs=exp_coeffs,
     output_coeffs=results_dur_dwt.coeffs,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     mother_wavelet=MOTHER,
 )
 time_scale_results
@@ -488,9 +535,9 @@ time_scale_results
 
 # %%
 time_scale_results = regression.time_scale_regression(
-    input_coeffs=results_exp_dwt.coeffs,
+    input_coeffs=exp_coeffs,
     output_coeffs=results_save_dwt.coeffs,
-    levels=results_exp_dwt.levels,
+    levels=exp_levels,
     mother_wavelet=MOTHER,
 )
 time_scale_results
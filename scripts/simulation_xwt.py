@@ -31,9 +31,7 @@ def main() -> None:
     denorm_freqs = freqs * sample_freq
     period = 1 / freqs
     power = (np.abs(xwt_result)) ** 2  ## Normalize wavelet power spectrum
-    n = signal1.size
-    sig95 = np.ones([1, n]) * signif[:, None]
-    sig95 = power / sig95  ## Want where power / sig95 > 1
+    sig95 = power / signif[:, None]  ## Want where power / sig95 > 1
     coi_plot = np.concatenate(
         [np.log2(coi), [1e-9], np.log2(period[-1:]), np.log2(period[-1:]), [1e-9]]
     )
@@ -0,0 +1,151 @@
+"""On-disk cache for API responses"""
+
+from datetime import datetime, timedelta
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import sys
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import orjson
+import pandas as pd
+
+from src.logging_helpers import define_other_module_log_level
+
+# * Logging settings
+logger = logging.getLogger(__name__)
+define_other_module_log_level("info")
+logger.setLevel(logging.DEBUG)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+# * Column holding the JSON-encoded records
+RECORD_COLUMN = "record"
+
+
+class FileCache:
+    """Stores list-of-records API responses as Parquet files under
+    `{location}/{endpoint}/{md5(params)}.parquet`, with a sidecar JSON holding the
+    fetch timestamp. Each record is kept as its own JSON string, so nested,
+    mixed-type and ragged records come back exactly as fetched.\n
+    The cache fails open: read or write errors are logged and the request is
+    served live"""
+
+    def __init__(self, location: Union[str, os.PathLike]) -> None:
+        self.location = Path(location)
+
+    def define_paths(self, endpoint: str, params: Dict[str, Any]) -> Tuple[Path, Path]:
+        """Paths of data and metadata files for request `params`"""
+        key = hashlib.md5(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        endpoint_dir = self.location / endpoint
+        return endpoint_dir / f"{key}.parquet", endpoint_dir / f"{key}.json"
+
+    def load(
+        self, endpoint: str, params: Dict[str, Any], ttl_days: float
+    ) -> Union[List[Dict[str, Any]], None]:
+        """Return cached records if fetched less than `ttl_days` ago, otherwise None
+        (also if the cached files can't be read)"""
+        data_path, meta_path = self.define_paths(endpoint, params)
+        if not data_path.exists() or not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            fetched = datetime.fromisoformat(metadata["fetched"])
+            if datetime.now() - fetched > timedelta(days=ttl_days):
+                logger.debug("Cache expired for %s %s", endpoint, params)
+                return None
+            records = [
+                orjson.loads(record)
+                for record in pd.read_parquet(data_path)[RECORD_COLUMN]
+            ]
+        except Exception as e:
+            logger.warning(
+                "Ignoring unreadable cache for %s %s: %r", endpoint, params, e
+            )
+            return None
+        logger.debug("Cache hit for %s %s", endpoint, params)
+        return records
+
+    def store(
+        self, endpoint: str, params: Dict[str, Any], data: List[Dict[str, Any]]
+    ) -> None:
+        """Persist records, skipping failed requests and non-tabular responses.
+        Errors are logged, never raised, so a fetched response is still returned"""
+        if not isinstance(data, list) or len(data) == 0:
+            return
+        data_path, meta_path = self.define_paths(endpoint, params)
+        try:
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            pd.DataFrame(
+                {RECORD_COLUMN: [orjson.dumps(record).decode() for record in data]}
+            ).to_parquet(data_path, compression="zstd")
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"fetched": datetime.now().isoformat(), "params": params},
+                    f,
+                    default=str,
+                )
+        except Exception as e:
+            logger.warning("Could not cache %s %s: %r", endpoint, params, e)
+            ## Don't leave a data file without its timestamp (or vice versa)
+            data_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+
+    def clear(self, endpoint: Union[str, None] = None) -> None:
+        """Delete cached responses for `endpoint`, or all endpoints if None"""
+        target = self.location if endpoint is None else self.location / endpoint
+        shutil.rmtree(target, ignore_errors=True)
+
+    def cached(self, endpoint: str, ttl_days: float = 1) -> Callable:
+        """Decorator caching a retrieval function's records, keyed by its arguments.
+        Works with blocking and asynchronous functions (a `session` argument is
+        not part of the key). Pass `invalidate=True` to the decorated function to
+        force a fresh request"""
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+
+            def define_params(*args, **kwargs) -> Dict[str, Any]:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = {}
+                for name, value in bound.arguments.items():
+                    kind = signature.parameters[name].kind
+                    if kind == inspect.Parameter.VAR_KEYWORD:
+                        params.update(value)
+                    elif name != "session":
+                        params[name] = value
+                return params
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, invalidate: bool = False, **kwargs):
+                    params = define_params(*args, **kwargs)
+                    data = None if invalidate else self.load(endpoint, params, ttl_days)
+                    if data is None:
+                        data = await func(*args, **kwargs)
+                        self.store(endpoint, params, data)
+                    return data
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, invalidate: bool = False, **kwargs):
+                params = define_params(*args, **kwargs)
+                data = None if invalidate else self.load(endpoint, params, ttl_days)
+                if data is None:
+                    data = func(*args, **kwargs)
+                    self.store(endpoint, params, data)
+                return data
+
+            return wrapper
+
+        return decorator
@@ -4,17 +4,19 @@ based off: https://pycwt.reaDThedocs.io/en/latest/tutorial.html
 """
 
 from __future__ import division
+import functools
 import logging
 import sys
 from dataclasses import dataclass, field
 
-from typing import List, Type
+from typing import List, Tuple, Type
 
 import numpy as np
 import numpy.typing as npt
 import matplotlib.pyplot as plt
 
 import pycwt as wavelet
+import scipy.fft
 
 from constants import ids
 from src.logging_helpers import define_other_module_log_level
@@ -40,6 +42,8 @@ DJ = 1 / 12  # Twelve sub-octaves per octaves
 J = 7 / DJ  # Seven powers of two with DJ sub-octaves
 MOTHER = wavelet.Morlet(f0=6)
 LEVELS = [0.0625, 0.125, 0.25, 0.5, 1, 2, 4, 8, 16]  # Period scale is logarithmic
+FFT_WORKERS = -1  # Split the per-scale inverse FFTs across all cores
+CWT_DTYPE = np.float32  # Power spectra are only plotted, so single precision suffices
 
 
 @dataclass
@@ -54,9 +58,11 @@ class DataForCWT:
     initial_scale: float
     levels: List[float]
     time_range: npt.NDArray = field(init=False)
+    log2_levels: npt.NDArray = field(init=False)
 
     def __post_init__(self):
         self.time_range = self.time_range(self)
+        self.log2_levels = np.log2(self.levels)
 
     def time_range(self) -> npt.NDArray:
         """Takes first date and creates array with date based on defined dt"""
@@ -80,6 +86,74 @@ class ResultsFromCWT:
 
 
 # * Functions
+@functools.lru_cache(maxsize=16)
+def define_wavelet_kernels(
+    fft_size: int,
+    delta_t: float,
+    delta_j: float,
+    initial_scale: float,
+    scale_count: float,
+    mother_wavelet: Type,
+    dtype: str = "complex128",
+) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    """Scales, Fourier frequencies, and normalized conjugate wavelet Fourier
+    transforms (one row per scale, as `dtype`) for signals padded to `fft_size`.\n
+    Cached, so all series of the same length share one kernel set"""
+    scales = initial_scale * 2 ** (np.arange(0, scale_count + 1) * delta_j)
+    freqs = 1 / (mother_wavelet.flambda() * scales)
+    ## Fourier angular frequencies
+    ftfreqs = 2 * np.pi * np.fft.fftfreq(fft_size, delta_t)
+    scales_col = scales[:, np.newaxis]
+    kernels = (scales_col * ftfreqs[1] * fft_size) ** 0.5 * np.conjugate(
+        mother_wavelet.psi_ft(scales_col * ftfreqs)
+    )
+    ## Real-valued kernels (e.g. Morlet) keep the matching real precision
+    kernels = kernels.astype(np.finfo(dtype).dtype if np.isrealobj(kernels) else dtype)
+    for array in (scales, freqs, kernels):
+        array.setflags(write=False)
+    return scales, freqs, kernels
+
+
+def transform_signal(
+    signal: npt.NDArray,
+    delta_t: float,
+    delta_j: float,
+    initial_scale: float,
+    scale_count: float,
+    mother_wavelet: Type,
+) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+    """Continuous wavelet transform as in `pycwt.cwt`, with one FFT of the signal
+    multiplied by the cached wavelet kernels of every scale. Single precision
+    signals are transformed in single precision.\n
+    Returns wavelet transform, scales, Fourier frequencies, and cone of influence"""
+    num_observations = len(signal)
+    ## Pad to next power of 2 to speed up FFT
+    fft_size = int(2 ** np.ceil(np.log2(num_observations)))
+    signal_ft = scipy.fft.fft(signal, n=fft_size)
+    scales, freqs, kernels = define_wavelet_kernels(
+        fft_size,
+        delta_t,
+        delta_j,
+        initial_scale,
+        scale_count,
+        mother_wavelet,
+        signal_ft.dtype.name,
+    )
+    wave = scipy.fft.ifft(signal_ft * kernels, axis=1, workers=FFT_WORKERS)
+
+    ## Remove scales whose transform is entirely NaN
+    sel = np.invert(np.isnan(wave).all(axis=1))
+    if np.any(sel):
+        scales, freqs, wave = scales[sel], freqs[sel], wave[sel, :]
+
+    ## Cone of influence in Fourier periods (Bartlett window)
+    coi = num_observations / 2 - np.abs(
+        np.arange(0, num_observations) - (num_observations - 1) / 2
+    )
+    coi = mother_wavelet.flambda() * mother_wavelet.coi() * delta_t * coi
+    return wave[:, :num_observations], scales, freqs, coi
+
+
 def run_cwt(
     cwt_data: Type[DataForCWT],
     normalize: bool = True,
@@ -99,8 +173,8 @@ def run_cwt(
 
     # * Conduct transformations
     # Wavelet transform
-    wave, scales, freqs, cwt_coi, _, _ = wavelet.cwt(
-        dat_norm, DT, DJ, S0, J, cwt_data.mother_wavelet
+    wave, scales, freqs, cwt_coi = transform_signal(
+        dat_norm.astype(CWT_DTYPE), DT, DJ, S0, J, cwt_data.mother_wavelet
     )
     # Normalized wavelet power spectrum
     cwt_power = (np.abs(wave)) ** 2
@@ -109,7 +183,6 @@ def run_cwt(
 
     # * Statistical significance
     # where the ratio ``cwt_power / sig95 > 1``.
-    num_observations = len(cwt_data.t_values)
     signif, _ = wavelet.significance(
         1.0,
         DT,
@@ -119,8 +192,7 @@ def run_cwt(
         significance_level=0.95,
         wavelet=cwt_data.mother_wavelet,
     )
-    cwt_sig95 = np.ones([1, num_observations]) * signif[:, None]
-    cwt_sig95 = cwt_power / cwt_sig95
+    cwt_sig95 = cwt_power / signif[:, None].astype(cwt_power.dtype)
 
     return ResultsFromCWT(cwt_power, cwt_period, cwt_sig95, cwt_coi)
 
@@ -138,7 +210,7 @@ def plot_cwt(
         cwt_data.time_range,
         np.log2(cwt_results.period),
         np.log2(cwt_results.power),
-        np.log2(cwt_data.levels),
+        cwt_data.log2_levels,
         extend="both",
         cmap=kwargs["cmap"],
     )
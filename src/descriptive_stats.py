@@ -4,17 +4,20 @@ import logging
 from pathlib import Path
 import sys
 
-from typing import Any, Dict, Hashable, List, Union
+from typing import Any, Dict, Hashable, List, Tuple, Union
 
-import matplotlib.pyplot as plt
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 from scipy import stats
-import statsmodels.graphics.tsaplots
-import statsmodels.stats.diagnostic
+import scipy.fft
 
 from constants import ids
-from src.helpers import add_real_value_columns, calculate_diff_in_log
+from src.helpers import (
+    add_real_value_columns,
+    calculate_diff_in_log,
+    combine_series,
+)
 from src.logging_helpers import define_other_module_log_level
 from src import retrieve_data
 
@@ -37,10 +40,14 @@ DESCRIPTIVE_STATS = [
     "Shapiro-Wilk",
     "Ljung-Box",
 ]
-NORMALITY_TESTS = {"Jarque-Bera": stats.jarque_bera, "Shapiro-Wilk": stats.shapiro}
 PANDAS_METHODS = ["count", "mean", "std", "skewness", "kurtosis"]
 HYPOTHESIS_THRESHOLD = [0.1, 0.05, 0.001]
 LJUNG_BOX_LAGS = [15]
+SHAPIRO_MAX_OBSERVATIONS = 5000
+JARQUE_BERA_MIN_ASYMPTOTIC = 2000
+MONTE_CARLO_RESAMPLES = 9999
+MONTE_CARLO_BATCH = 1000
+MONTE_CARLO_SEED = 2024
 
 
 def include_statistic(
@@ -54,53 +61,174 @@ def include_statistic(
     return results_dict
 
 
+def count_p_value_stars(
+    p_values: npt.ArrayLike, hypothesis_threshold: List[float]
+) -> npt.NDArray:
+    """Number of p value thresholds that each p value falls at or below"""
+    thresholds = np.sort(hypothesis_threshold)
+    return len(thresholds) - np.searchsorted(thresholds, p_values, side="left")
+
+
 def add_p_value_stars(
     test_statistic: Union[int, float], p_value: float, hypothesis_threshold: List[float]
 ) -> str:
     """Add stars (*) for each p value threshold that the test statistic falls below"""
-    star_test_statistic = str(test_statistic)
-    for p_threshold in sorted(hypothesis_threshold):
-        star_test_statistic += "*" if p_value <= p_threshold else ""
-    return star_test_statistic
+    return f"{test_statistic}{'*' * int(count_p_value_stars(p_value, hypothesis_threshold))}"
+
+
+def format_test_results(
+    columns: List[str],
+    test_stats: npt.NDArray,
+    p_values: npt.NDArray,
+    add_pvalue_stars: bool = False,
+) -> Dict[str, Union[float, str]]:
+    """Map each column to its test statistic, with stars (*) for each p value
+    threshold the test statistic falls below"""
+    if not add_pvalue_stars:
+        return dict(zip(columns, np.asarray(test_stats).tolist()))
+    star_counts = count_p_value_stars(p_values, HYPOTHESIS_THRESHOLD)
+    return {
+        col: f"{stat}{'*' * count}" if not np.isnan(stat) else stat
+        for col, stat, count in zip(
+            columns, np.asarray(test_stats).tolist(), star_counts.tolist()
+        )
+    }
+
+
+def jarque_bera_statistic(x: npt.NDArray, axis: int = 0) -> npt.NDArray:
+    """Jarque-Bera statistic along `axis` of `x`, ignoring NaNs. Uses the same
+    (biased) sample moments as `scipy.stats.jarque_bera`"""
+    missing = np.isnan(x)
+    ## NaN-aware reductions are much slower, so only use them when needed
+    mean = np.nanmean if missing.any() else np.mean
+    n = np.count_nonzero(~missing, axis=axis)
+    centered = x - mean(x, axis=axis, keepdims=True)
+    centered_sq = centered * centered
+    m2 = mean(centered_sq, axis=axis)
+    skewness = mean(centered_sq * centered, axis=axis) / m2**1.5
+    excess_kurtosis = mean(centered_sq * centered_sq, axis=axis) / m2**2 - 3
+    return n / 6 * (skewness**2 + excess_kurtosis**2 / 4)
+
+
+def jarque_bera_columns(
+    x: npt.NDArray,
+    monte_carlo: bool = False,
+    n_resamples: int = MONTE_CARLO_RESAMPLES,
+    seed: int = MONTE_CARLO_SEED,
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Jarque-Bera statistic and asymptotic chi-square(2) p value for each column
+    of `x`, ignoring NaNs.\n
+    The chi-square p value is only accurate asymptotically: with `monte_carlo`,
+    columns with fewer than `JARQUE_BERA_MIN_ASYMPTOTIC` observations instead get
+    p values from `n_resamples` draws under a normal null, seeded by `seed`"""
+    test_stats = jarque_bera_statistic(x)
+    p_values = stats.chi2.sf(test_stats, df=2)
+    if not monte_carlo:
+        return test_stats, p_values
+    rng = np.random.default_rng(seed)
+    for i, col in enumerate(x.T):
+        col = col[~np.isnan(col)]
+        if len(col) >= JARQUE_BERA_MIN_ASYMPTOTIC or len(col) < 4:
+            continue
+        result = stats.monte_carlo_test(
+            col,
+            rng.standard_normal,
+            jarque_bera_statistic,
+            vectorized=True,
+            n_resamples=n_resamples,
+            batch=MONTE_CARLO_BATCH,
+            alternative="greater",
+        )
+        p_values[i] = result.pvalue
+    return test_stats, p_values
+
+
+def shapiro_columns(x: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Shapiro-Wilk statistic and p value for each column of `x`, ignoring NaNs.
+    Columns with more than `SHAPIRO_MAX_OBSERVATIONS` observations are skipped
+    (NaN), since the p value is no longer accurate"""
+    test_stats = np.full(x.shape[1], np.nan)
+    p_values = np.full(x.shape[1], np.nan)
+    for i, col in enumerate(x.T):
+        col = col[~np.isnan(col)]
+        if len(col) > SHAPIRO_MAX_OBSERVATIONS:
+            logger.warning(
+                "Skipping Shapiro-Wilk for series with %s observations", len(col)
+            )
+            continue
+        test_stats[i], p_values[i] = stats.shapiro(col)
+    return test_stats, p_values
+
+
+NORMALITY_TESTS = {"Jarque-Bera": jarque_bera_columns, "Shapiro-Wilk": shapiro_columns}
+
+
+def extract_test_matrix(
+    data: Union[pd.DataFrame, None],
+    date_column: str,
+    x: Union[npt.NDArray, None],
+    columns: Union[List[str], None],
+) -> Tuple[npt.NDArray, List[str]]:
+    """Float matrix and column names to test, built from `data` unless
+    prebuilt `x` and `columns` are given"""
+    if x is not None:
+        return x, columns
+    cols_to_test = data.drop(date_column, axis=1)
+    return cols_to_test.to_numpy(dtype=float), cols_to_test.columns.to_list()
 
 
 def test_normality(
     normality_test: str,
-    data: pd.DataFrame,
+    data: Union[pd.DataFrame, None] = None,
     date_column: str = "date",
     add_pvalue_stars: bool = False,
-) -> Dict[str, str]:
-    """Generate dictionary with Jarque-Bera test results for each dataset"""
-    results_dict = {}
-    cols_to_test = data.drop(date_column, axis=1).columns.to_list()
-    for col in cols_to_test:
-        x = data[col].dropna().to_numpy()
-        test_stat, p_value = NORMALITY_TESTS[normality_test](x)
-        if add_pvalue_stars:
-            result = add_p_value_stars(test_stat, p_value, HYPOTHESIS_THRESHOLD)
-        results_dict[col] = result
-    return results_dict
+    x: Union[npt.NDArray, None] = None,
+    columns: Union[List[str], None] = None,
+    **kwargs,
+) -> Dict[str, Union[float, str]]:
+    """Generate dictionary with normality test results for each dataset, from
+    `data` or a prebuilt (observations, series) matrix `x` with `columns`.
+    `kwargs` are passed to the test (e.g. `monte_carlo` for Jarque-Bera)"""
+    x, columns = extract_test_matrix(data, date_column, x, columns)
+    test_stats, p_values = NORMALITY_TESTS[normality_test](x, **kwargs)
+    return format_test_results(columns, test_stats, p_values, add_pvalue_stars)
+
+
+def ljung_box_columns(
+    x: npt.NDArray, lags: List[int]
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Ljung-Box statistics and p values, shape (len(lags), columns), for each
+    column of `x`. Autocorrelations of all columns come from one zero-padded FFT"""
+    num_observations = x.shape[0]
+    max_lag = max(lags)
+    centered = x - x.mean(axis=0)
+    fft_size = scipy.fft.next_fast_len(2 * num_observations - 1, real=True)
+    spectrum = scipy.fft.rfft(centered, n=fft_size, axis=0)
+    autocov = scipy.fft.irfft(spectrum * spectrum.conj(), n=fft_size, axis=0)[
+        : max_lag + 1
+    ]
+    autocorr = autocov[1:] / autocov[0]
+    k = np.arange(1, max_lag + 1)[:, None]
+    cumulative_q = np.cumsum(autocorr**2 / (num_observations - k), axis=0)
+    lag_idx = np.asarray(lags) - 1
+    test_stats = num_observations * (num_observations + 2) * cumulative_q[lag_idx]
+    p_values = stats.chi2.sf(test_stats, df=np.asarray(lags)[:, None])
+    return test_stats, p_values
 
 
 def conduct_ljung_box(
-    data: pd.DataFrame,
-    lags: List[int],
+    data: Union[pd.DataFrame, None] = None,
+    lags: List[int] = LJUNG_BOX_LAGS,
     date_column: str = "date",
     add_pvalue_stars: bool = False,
-) -> Dict[str, str]:
-    """Generate dictionary with Ljung-Box test results for each dataset"""
-    results_dict = {}
-    cols_to_test = data.drop(date_column, axis=1).columns.to_list()
-    for col in cols_to_test:
-        test_results = statsmodels.stats.diagnostic.acorr_ljungbox(data[col], lags=lags)
-        test_stat, p_value = (
-            test_results["lb_stat"].iat[0],
-            test_results["lb_pvalue"].iat[0],
-        )
-        if add_pvalue_stars:
-            result = add_p_value_stars(test_stat, p_value, HYPOTHESIS_THRESHOLD)
-        results_dict[col] = result
-    return results_dict
+    x: Union[npt.NDArray, None] = None,
+    columns: Union[List[str], None] = None,
+) -> Dict[str, Union[float, str]]:
+    """Generate dictionary with Ljung-Box test results (first of `lags`) for
+    each dataset, from `data` or a prebuilt matrix `x` with `columns`"""
+    x, columns = extract_test_matrix(data, date_column, x, columns)
+    test_stats, p_values = ljung_box_columns(x, lags)
+    return format_test_results(columns, test_stats[0], p_values[0], add_pvalue_stars)
 
 
 def correlation_matrix_pvalues(
@@ -116,8 +244,9 @@ def correlation_matrix_pvalues(
     pval = data.corr(
         method=lambda x, y: stats.pearsonr(x, y)[1], numeric_only=True
     ) - np.eye(*rho.shape)
-    p = pval.applymap(
-        lambda x: "".join(["*" for threshold in hypothesis_threshold if x <= threshold])
+    star_counts = count_p_value_stars(pval.to_numpy(), hypothesis_threshold)
+    p = pd.DataFrame(
+        np.char.multiply("*", star_counts), index=pval.index, columns=pval.columns
     )
     corr_matrix = rho.round(decimals).astype(str) + p
     if display:
@@ -159,33 +288,71 @@ def create_summary_table(
     return df
 
 
+def batch_moments(x: npt.NDArray, columns: List[str]) -> Dict[str, Dict[str, float]]:
+    """Count, mean, std, skewness and (excess) kurtosis (the `PANDAS_METHODS`) of
+    each column of `x` in one sweep over the data, ignoring NaNs. Skewness and
+    kurtosis are bias-corrected like `pd.DataFrame.skew` and `pd.DataFrame.kurt`"""
+    n = np.count_nonzero(~np.isnan(x), axis=0)
+    mean = np.nanmean(x, axis=0)
+    ## Central moments, from deviations rather than raw power sums for stability
+    centered = x - mean
+    centered_sq = centered * centered
+    m2 = np.nansum(centered_sq, axis=0) / n
+    m3 = np.nansum(centered_sq * centered, axis=0) / n
+    m4 = np.nansum(centered_sq * centered_sq, axis=0) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        skewness = np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2**1.5
+        excess_kurtosis = (
+            (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * (m4 / m2**2 - 3) + 6)
+        )
+    moments = {
+        "count": n,
+        "mean": mean,
+        "std": np.sqrt(m2 * n / (n - 1)),
+        "skewness": skewness,
+        "kurtosis": excess_kurtosis,
+    }
+    return {
+        statistic: dict(zip(columns, values.tolist()))
+        for statistic, values in moments.items()
+    }
+
+
 def generate_descriptive_statistics(
-    data: pd.DataFrame, stats_test: List[str], **kwargs
+    data: pd.DataFrame,
+    stats_test: List[str],
+    jarque_bera_monte_carlo: bool = False,
+    **kwargs,
 ) -> pd.DataFrame:
-    """Produce descriptive statistics test results"""
+    """Produce descriptive statistics test results\n
+    With `jarque_bera_monte_carlo`, small-sample Jarque-Bera p values are
+    simulated (see `jarque_bera_columns`) and the row is labelled as such"""
     ## Initialize dict to store each test
     stats_test_dict = {}
     ## Initialize dict to store final results
     results_dict = {measure: {} for measure in data.columns if "date" not in measure}
+    ## Materialize the data matrix once for all tests
+    columns = list(results_dict)
+    x = data[columns].to_numpy(dtype=float)
+    moments = (
+        batch_moments(x, columns)
+        if any(test in PANDAS_METHODS for test in stats_test)
+        else {}
+    )
     for test in stats_test:
-        if test in PANDAS_METHODS and test == "skewness":
-            if test == "skewness":
-                stats_test_dict[test] = data.skew(numeric_only=True).to_dict()
-        elif test in PANDAS_METHODS and test != "skewness":
-            stats_test_dict[test] = getattr(data, test)(numeric_only=True).to_dict()
+        if test in PANDAS_METHODS:
+            stats_test_dict[test] = moments[test]
         elif test == "Ljung-Box":
             stats_test_dict[test] = conduct_ljung_box(
-                data=data,
-                lags=LJUNG_BOX_LAGS,
-                date_column="date",
-                add_pvalue_stars=True,
+                lags=LJUNG_BOX_LAGS, add_pvalue_stars=True, x=x, columns=columns
+            )
+        elif test == "Jarque-Bera" and jarque_bera_monte_carlo:
+            stats_test_dict[f"{test} (Monte Carlo)"] = test_normality(
+                test, add_pvalue_stars=True, x=x, columns=columns, monte_carlo=True
             )
         else:
             stats_test_dict[test] = test_normality(
-                normality_test=test,
-                data=data,
-                date_column="date",
-                add_pvalue_stars=True,
+                test, add_pvalue_stars=True, x=x, columns=columns
             )
     results_dict = complete_summary_results_dict(results_dict, stats_test_dict)
     logger.debug("results_dict after summary dict %s", results_dict)
@@ -228,11 +395,7 @@ def main() -> None:
     save.rename(columns={"value": "savings"}, inplace=True)
 
     # * Merge dataframes to align dates and remove extras
-    us_data = cpi.merge(inf, how="left")
-    us_data = us_data.merge(inf_exp, how="left")
-    us_data = us_data.merge(nondur_consump, how="left")
-    us_data = us_data.merge(dur_consump, how="left")
-    us_data = us_data.merge(save, how="left")
+    us_data = combine_series([cpi, inf, inf_exp, nondur_consump, dur_consump, save])
 
     # * Drop NaNs
     us_data.dropna(inplace=True)
@@ -269,6 +432,10 @@ def main() -> None:
     )
     print(us_corr)
 
+    ## Plotting libraries are only needed here, so keep module import light
+    import matplotlib.pyplot as plt
+    import statsmodels.graphics.tsaplots
+
     _, axs = plt.subplots(5)
     for ax, c in zip(axs, us_data.drop("date", axis=1).columns.to_list()):
         statsmodels.graphics.tsaplots.plot_acf(us_data[c], lags=36, ax=ax)
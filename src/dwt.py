@@ -2,13 +2,12 @@
 Smoothing of signals via wavelet reconstruction
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+import functools
 import logging
 import sys
-from typing import Dict, Generator, List, Tuple, Type, Union
+from typing import TYPE_CHECKING, Literal, Tuple, Type, Union
 
-import matplotlib.pyplot as plt
-import matplotlib.figure
 import numpy as np
 import numpy.typing as npt
 import pywt
@@ -16,6 +15,9 @@ import pywt
 from src.logging_helpers import define_other_module_log_level
 from src import retrieve_data
 
+if TYPE_CHECKING:
+    import matplotlib.figure
+
 # * Logging settings
 logger = logging.getLogger(__name__)
 define_other_module_log_level("debug")
@@ -26,7 +28,7 @@ logger.addHandler(logging.StreamHandler(sys.stdout))
 MOTHER = pywt.Wavelet("sym12")
 
 
-@dataclass
+@dataclass(slots=True)
 class DataForDWT:
     """Holds data for discrete wavelet transform"""
 
@@ -35,126 +37,183 @@ class DataForDWT:
     levels: float = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ResultsFromDWT:
     """Holds data for discrete wavelet transform
     `coeffs`: transform coefficients
     `levels`: transform levels applied
-    `smoothed_signal_dict`: dictionary of coefficients for each time scale"""
+    `smoothed_signals`: (levels, N) array, row `l - 1` is the signal with detail
+    levels <= l removed ((levels, series, N) for stacked series)"""
 
     coeffs: npt.NDArray
     levels: float
-    smoothed_signal_dict: Dict[int, Dict[str, npt.NDArray]] = field(
-        default_factory=dict
-    )
+    smoothed_signals: npt.NDArray = None
+
+
+@functools.lru_cache(maxsize=32)
+def load_wavelet(name: str) -> pywt.Wavelet:
+    """Wavelet object (with its filter banks) for `name`, built once per name"""
+    return pywt.Wavelet(name)
+
+
+def resolve_wavelet(wavelet: Union[str, pywt.Wavelet]) -> pywt.Wavelet:
+    """Cached wavelet object for a name, or the wavelet itself if already built"""
+    return load_wavelet(wavelet) if isinstance(wavelet, str) else wavelet
 
 
 def trim_signal(
-    original_signal: npt.NDArray, reconstructed: npt.NDArray
+    original_signal: npt.NDArray,
+    reconstructed: npt.NDArray,
+    how: Literal["none", "begin", "end"] = "begin",
 ) -> npt.NDArray:
-    """Removes first or last observation for odd-numbered datasets"""
+    """Removes first (`how="begin"`) or last (`how="end"`) observation for
+    odd-numbered datasets, or keeps the reconstruction as is (`how="none"`).
+    Time runs along the last axis"""
     ## Time series with uneven result in mismatched lengths with the reconstructed
     ## signal, so we remove a value from the approximated signal
-    if len(original_signal) % 2 != 0:
+    if np.shape(original_signal)[-1] % 2 == 0 or how == "none":
+        return reconstructed
+    if how == "begin":
         logger.warning("Trimming signal at beginning")
-        return reconstructed[1:]
-    return reconstructed
+        return np.asarray(reconstructed)[..., 1:]
+    if how == "end":
+        logger.warning("Trimming signal at end")
+        return np.asarray(reconstructed)[..., :-1]
+    raise ValueError(f"Unknown trim option {how}, expected none, begin or end")
 
 
 def run_dwt(dwt_data: Type[DataForDWT]) -> Type[ResultsFromDWT]:
     """Generate levels and coefficients from discrete wavelet transform with
-    given wavelet function"""
+    given wavelet function. `y_values` may stack several series as (series, N),
+    which are all transformed in one call along the last axis"""
     ## Define the wavelet type
-    # w = dwt_data.mother_wavelet
+    wavelet = resolve_wavelet(dwt_data.mother_wavelet)
     ## Choose the maximum decomposition level
     if dwt_data.levels is None:
         dwt_levels = pywt.dwt_max_level(
-            data_len=len(dwt_data.y_values), filter_len=dwt_data.mother_wavelet.dec_len
+            data_len=dwt_data.y_values.shape[-1], filter_len=wavelet.dec_len
         )
         print(
             f"""Max decomposition level of {dwt_levels} for time series length 
-            of {len(dwt_data.y_values)}"""
+            of {dwt_data.y_values.shape[-1]}"""
         )
     else:
         dwt_levels = dwt_data.levels
     dwt_coeffs = pywt.wavedec(
-        dwt_data.y_values, dwt_data.mother_wavelet, level=dwt_data.levels
+        dwt_data.y_values, wavelet, level=dwt_data.levels, axis=-1
     )
     return ResultsFromDWT(dwt_coeffs, dwt_levels)
 
 
 def smooth_signal(
     dwt_data: Type[DataForDWT],
+    trim: Literal["none", "begin", "end"] = "begin",
 ) -> Type[ResultsFromDWT]:
-    """Generate smoothed signals based off wavelet coefficients for each pre-defined level"""
-    ## Initialize dict for reconstructed signals
-    signals_dict = {}
-
+    """Generate smoothed signals based off wavelet coefficients for each pre-defined level\n
+    `trim` sets which end of the reconstruction is dropped for odd-length signals"""
     dwt_results = run_dwt(dwt_data)
+    wavelet = resolve_wavelet(dwt_data.mother_wavelet)
+
+    ## Initialize array for reconstructed signals, one row per level
+    *series_shape, signal_length = dwt_data.y_values.shape
+    if trim == "none":
+        signal_length += signal_length % 2
+    signals = np.empty((dwt_results.levels, *series_shape, signal_length))
 
     ## Loop through levels and remove detail level component(s)
-    # ! Note: signal_dict[l] provides the signal with levels <= l removed
+    # ! Note: signals[l - 1] provides the signal with levels <= l removed
     logger.debug(dwt_results.levels)
-    for l in range(dwt_results.levels, 0, -1):
-        print(f"s_{l} stored with key {l}")
-        smooth_coeffs = dwt_results.coeffs.copy()
-        signals_dict[l] = {}
-        ## Set remaining detail coefficients to zero
-        for coeff in range(1, l + 1):
-            smooth_coeffs[-1 * coeff] = np.zeros_like(smooth_coeffs[-1 * coeff])
-        signals_dict[l]["coeffs"] = smooth_coeffs
+    ## Each level drops one more detail band than the previous one, so zero
+    ## bands incrementally on a single running list (the original coefficient
+    ## arrays are swapped out, never modified)
+    smooth_coeffs = list(dwt_results.coeffs)
+    for l in range(1, dwt_results.levels + 1):
+        smooth_coeffs[-l] = cached_zeros(
+            smooth_coeffs[-l].shape, smooth_coeffs[-l].dtype.str
+        )
         # Reconstruct the signal using only the approximation coefficients
-        reconst = pywt.waverec(smooth_coeffs, dwt_data.mother_wavelet)
-        signals_dict[l]["signal"] = trim_signal(dwt_data.y_values, reconst)
-    dwt_results.smoothed_signal_dict = signals_dict
+        reconst = pywt.waverec(smooth_coeffs, wavelet, axis=-1)
+        signals[l - 1] = trim_signal(dwt_data.y_values, reconst, trim)
+        print(f"s_{l} stored in row {l - 1}")
+    dwt_results.smoothed_signals = signals
     return dwt_results
 
 
+def select_series(
+    dwt_results: Type[ResultsFromDWT], series: int
+) -> Type[ResultsFromDWT]:
+    """Results for one series out of a stacked (series, N) transform"""
+    return ResultsFromDWT(
+        [c[series] for c in dwt_results.coeffs],
+        dwt_results.levels,
+        dwt_results.smoothed_signals[:, series],
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def cached_zeros(shape: Tuple[int, ...], dtype: str) -> npt.NDArray:
+    """Read-only zero array, shared by reconstructions that blank out the same
+    coefficient shapes"""
+    zeros = np.zeros(shape, dtype=dtype)
+    zeros.flags.writeable = False
+    return zeros
+
+
 def reconstruct_signal_component(
     signal_coeffs: list, wavelet: str, level: int
-) -> tuple[dict, int]:
+) -> npt.NDArray:
     """Reconstruct individual component"""
-    component_coeffs = signal_coeffs.copy()
-    for l in range(len(signal_coeffs)):
-        if l == level:
-            component_coeffs[l] = component_coeffs[l]
-        else:
-            component_coeffs[l] = np.zeros_like(component_coeffs[l])
-    return pywt.waverec(component_coeffs, wavelet)
+    component_coeffs = [
+        c if l == level else cached_zeros(c.shape, c.dtype.str)
+        for l, c in enumerate(signal_coeffs)
+    ]
+    return pywt.waverec(component_coeffs, resolve_wavelet(wavelet))
+
+
+def reconstruct_components(
+    signal_coeffs: list, wavelet: str, levels: int
+) -> npt.NDArray:
+    """Reconstruct smooth (row 0) and detail (rows 1-`levels`) components,
+    stacked as a (levels + 1, N) array"""
+    return np.stack(
+        [
+            reconstruct_signal_component(signal_coeffs, wavelet, l)
+            for l in range(levels + 1)
+        ]
+    )
 
 
 def plot_smoothing(
-    smooth_signals: dict,
+    smooth_signals: npt.NDArray,
     original_t: npt.NDArray,
     original_y: npt.NDArray,
     ascending: bool = False,
     **kwargs,
-) -> Tuple[matplotlib.figure.Figure, str]:
-    """Graph series of smoothed signals with original signal"""
-
-    # * Input name of time series
-    name = input("Enter name of time series (to be included in plot)")
-    while isinstance(name, str) is False:
-        input("Please enter a name as text")
+) -> "matplotlib.figure.Figure":
+    """Graph series of smoothed signals (rows of `smooth_signals`) with original
+    signal"""
+    ## Imported on use so that smoothing alone does not load matplotlib
+    import matplotlib.pyplot as plt
 
+    levels = len(smooth_signals)
     fig = plt.figure(figsize=kwargs["figsize"])
     # * Loop through levels and add detail level components
     if ascending:
-        order = reversed(list(smooth_signals.items()))
+        order = range(1, levels + 1)
     else:
-        order = list(smooth_signals.items())
-    for i, (level, signal) in enumerate(order, 1):
-        smooth_level = len(smooth_signals) - level
+        order = range(levels, 0, -1)
+    for i, level in enumerate(order, 1):
+        smooth_level = levels - level
         ## Subplot for each smooth signal
-        plt.subplot(len(smooth_signals), 1, i)
+        plt.subplot(levels, 1, i)
         plt.plot(original_t, original_y, label="Actual")
-        plt.plot(original_t, signal["signal"])
+        plt.plot(original_t, smooth_signals[level - 1])
         plt.xlabel("Year")
         plt.grid()
         plt.title(rf"Approximation: $S_{{j-{smooth_level}}}$")
         if i == 1:
             plt.legend()
-    return fig, name
+    return fig
 
 
 def main() -> None:
@@ -169,9 +228,12 @@ def main() -> None:
     # * Apply DWT and smooth signal
     results_from_dwt = smooth_signal(data_for_dwt)
 
-    fig, fig_title = plot_smoothing(
-        results_from_dwt.smoothed_signal_dict, t, y, figsize=(10, 10)
-    )
+    import matplotlib.pyplot as plt
+
+    # * Input name of time series
+    fig_title = input("Enter name of time series (to be included in plot)")
+
+    fig = plot_smoothing(results_from_dwt.smoothed_signals, t, y, figsize=(10, 10))
 
     plt.xlabel("Year")
     plt.ylabel(f"{fig_title.capitalize()}")
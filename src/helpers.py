@@ -1,6 +1,6 @@
 """Cross-project helper functions"""
 
-from typing import Dict, Generator, List
+from typing import Dict, Generator, List, Union
 
 import numpy as np
 import pandas as pd
@@ -24,6 +24,32 @@ def nested_list_values(nested_list: List[List[str]]) -> Generator[any, any, any]
             yield v
 
 
+def combine_series(
+    dataframes: List[pd.DataFrame],
+    on: str = "date",
+    how: str = "left",
+    validate: Union[str, None] = None,
+) -> pd.DataFrame:
+    """Align series on `on` with a single index join, equivalent to chaining
+    `merge(how=how)` from the first dataframe\n
+    With `validate="one_to_one"`, raises `pd.errors.MergeError` if any series
+    has duplicate `on` values"""
+    first, *others = [df.set_index(on) for df in dataframes]
+    if validate == "one_to_one":
+        for df in [first, *others]:
+            if not df.index.is_unique:
+                raise pd.errors.MergeError(
+                    f"Merge keys in {on} are not unique; not a one-to-one merge"
+                )
+    elif validate is not None:
+        raise ValueError(f"Unsupported validation {validate}, expected one_to_one")
+    if not others:
+        return first.reset_index()
+    ## Align the other series with each other first so `first` keeps its dtypes
+    others = pd.concat(others, axis=1, join="inner" if how == "inner" else "outer")
+    return first.join(others, how=how).reset_index()
+
+
 def convert_to_real_value(
     nominal_value: float, cpi_t: float, cpi_constant: float
 ) -> pd.DataFrame:
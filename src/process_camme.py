@@ -125,7 +125,7 @@ def create_complete_dataframe(dir_dict: Dict[str, pd.DataFrame]) -> pd.DataFrame
 
 
 def preprocess(
-    data_dir: Union[str, os.PathLike]
+    data_dir: Union[str, os.PathLike], verbose: bool = False
 ) -> tuple[dict[str, pd.DataFrame], pd.DataFrame]:
     """Create DataFrame with all years' data"""
     logging.info("Retrieving folders")
@@ -138,17 +138,18 @@ def preprocess(
     end = time.time()
     dtime = end - start
     ## Elapsed time before change: 11.67s
-    print(dfs["1989"].head())
-    print(dfs["1991"].head())
-    print(dfs["2004"].head())
-    print(dfs["2021"].head())
+    if verbose:
+        print(dfs["1989"].head())
+        print(dfs["1991"].head())
+        print(dfs["2004"].head())
+        print(dfs["2021"].head())
     logging.info("Elapsed time to convert to DataFrames: %s", dtime)
     return dfs, create_complete_dataframe(dfs)
 
 
 def main() -> None:
     """Run script"""
-    _, df_final = preprocess(camme_dir)
+    _, df_final = preprocess(camme_dir, verbose=True)
     print(df_final[df_final["year"] == 2021].head())
     print(df_final.tail())
     print(df_final.info())
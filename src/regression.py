@@ -1,9 +1,12 @@
 """Conduct regression using denoised data via DWT"""
 
+import asyncio
+from dataclasses import dataclass
 import logging
+import os
 import sys
 
-from typing import Dict, Type
+from typing import Dict, List, Type
 
 import matplotlib.pyplot as plt
 import matplotlib.figure
@@ -16,6 +19,7 @@ import statsmodels.api as sm
 import statsmodels.iolib.summary2
 
 from src import dwt
+from src.helpers import combine_series
 from src.logging_helpers import define_other_module_log_level
 from src import retrieve_data
 
@@ -29,6 +33,29 @@ logger.addHandler(logging.StreamHandler(sys.stdout))
 # ! Define mother wavelet
 MOTHER = pywt.Wavelet("db4")
 
+# * Fit a regression line in every pair plot cell only when requested
+PAIRPLOT_REGRESSION = os.getenv("PLOT_PAIRPLOT", "").lower() in {"1", "true", "yes"}
+
+
+@dataclass
+class ResultsFromApproximation:
+    """Holds least squares estimates from regressing `endog` on `exog`.
+    Call `fit()` for the full statsmodels results (standard errors, tests, etc.)"""
+
+    exog: npt.NDArray
+    endog: npt.NDArray
+    params: npt.NDArray
+    resid: npt.NDArray
+    ssr: float
+
+    def fit(self) -> sm.regression.linear_model.RegressionResultsWrapper:
+        """Fit OLS model with statsmodels"""
+        return sm.OLS(self.endog, self.exog).fit()
+
+    def summary(self) -> statsmodels.iolib.summary.Summary:
+        """Summarize OLS results with statsmodels"""
+        return self.fit().summary()
+
 
 def simple_regression(
     data: pd.DataFrame, x_var: str, y_var: str, add_constant: bool = True
@@ -44,27 +71,53 @@ def simple_regression(
 
 
 def wavelet_approximation(
-    smooth_t_dict: Dict[int, Dict[str, npt.NDArray]],
+    smooth_signals: npt.NDArray,
     original_y: npt.NDArray,
     levels: int,
     add_constant: bool = True,
     verbose: bool = False,
-) -> Dict[int, Type[sm.regression.linear_model.RegressionResultsWrapper]]:
-    """Regresses smooth components"""
-    regressions_dict = {}
-    crystals = list(range(1, levels + 1))
-    for c in crystals:
-        x_c = smooth_t_dict[c]["signal"]
-        if add_constant:
-            x_c = sm.add_constant(x_c)
-        model = sm.OLS(original_y, x_c)
-        results = model.fit()
-        if verbose:
+) -> Dict[int, Type[ResultsFromApproximation]]:
+    """Regresses smooth components (rows of `smooth_signals`, as in
+    `ResultsFromDWT.smoothed_signals`)\n
+    Only least squares estimates are computed; statsmodels results are built on
+    demand with `fit()` or `summary()`"""
+    regressions_dict = wavelet_approximation_multi(
+        smooth_signals, {"y": original_y}, levels, add_constant
+    )["y"]
+    if verbose:
+        for c, results in regressions_dict.items():
             print("\n\n")
             print(f"-----Smoothed model, Removing D_{list(range(1, c+1))}-----")
             print("\n")
             print(results.summary())
-        regressions_dict[c] = results
+    return regressions_dict
+
+
+def wavelet_approximation_multi(
+    smooth_signals: npt.NDArray,
+    original_ys: Dict[str, npt.NDArray],
+    levels: int,
+    add_constant: bool = True,
+) -> Dict[str, Dict[int, Type[ResultsFromApproximation]]]:
+    """Regresses each series in `original_ys` on the same smooth components,
+    solving all series at once for each level (one factorization of the design
+    matrix).\n
+    Returns `{series name: {level: results}}`"""
+    names = list(original_ys)
+    y_matrix = np.column_stack([original_ys[name] for name in names])
+    regressions_dict = {name: {} for name in names}
+    crystals = list(range(1, levels + 1))
+    for c in crystals:
+        x_c = smooth_signals[c - 1][:, np.newaxis]
+        if add_constant:
+            x_c = sm.add_constant(x_c)
+        params, _, _, _ = np.linalg.lstsq(x_c, y_matrix, rcond=None)
+        resid = y_matrix - x_c @ params
+        ssr = np.einsum("ij,ij->j", resid, resid)
+        for i, name in enumerate(names):
+            regressions_dict[name][c] = ResultsFromApproximation(
+                x_c, y_matrix[:, i], params[:, i], resid[:, i], float(ssr[i])
+            )
     return regressions_dict
 
 
@@ -78,15 +131,19 @@ def time_scale_regression(
     """Regresses output on  input for each component vector S_J, D_J, ..., D_1,
     where J=levels"""
     regressions_dict = {}
+    # * Reconstruct all component vectors, one row per component
+    input_components = dwt.reconstruct_components(input_coeffs, mother_wavelet, levels)
+    output_components = dwt.reconstruct_components(
+        output_coeffs, mother_wavelet, levels
+    )
     for j in range(levels + 1):
         if j == 0:
             vector_name = f"S_{levels}"
         else:
             vector_name = f"D_{levels - j + 1}"
         print(f"Regressing on component vector {vector_name}")
-        # * Reconstruct each component vector indiviually
-        input_j = dwt.reconstruct_signal_component(input_coeffs, mother_wavelet, j)
-        output_j = dwt.reconstruct_signal_component(output_coeffs, mother_wavelet, j)
+        input_j = input_components[j]
+        output_j = output_components[j]
 
         # * Run regression
         if add_constant:
@@ -103,10 +160,11 @@ def time_scale_regression(
 
 def align_series(t_values: npt.NDArray, series_vlaues: npt.NDArray) -> npt.NDArray:
     """Aligns series lengths when they are not equal by removing the first value"""
-    if len(series_vlaues) != len(t_values):
+    if series_vlaues.shape[-1] != len(t_values):
         logger.warning("Trimming series signal")
-        difference = np.abs(len(series_vlaues) - len(t_values))
-        return series_vlaues[difference:]
+        difference = np.abs(series_vlaues.shape[-1] - len(t_values))
+        return series_vlaues[..., difference:]
+    return series_vlaues
 
 
 def plot_compare_components(
@@ -122,68 +180,120 @@ def plot_compare_components(
 ) -> matplotlib.figure.Figure:
     """Plot each series component separately"""
     fig, ax = plt.subplots(levels + 1, 1, **kwargs)
-    smooth_component_x = dwt.reconstruct_signal_component(smooth_a_coeffs, wavelet, 0)
-    smooth_component_y = dwt.reconstruct_signal_component(smooth_b_coeffs, wavelet, 0)
-
-    # * Align array legnths
-    smooth_component_x = align_series(time, smooth_component_x)
-    smooth_component_y = align_series(time, smooth_component_y)
-    logger.warning(
-        "lengths x: %s, y: %s, t: %s",
-        len(smooth_component_x),
-        len(smooth_component_y),
-        len(time),
+
+    # * Reconstruct smooth (0) and detail components, stacked as (levels + 1, N)
+    components = {
+        c: align_series(time, dwt.reconstruct_components(c_coeffs, wavelet, levels))
+        for c, c_coeffs in zip([a_label, b_label], [smooth_a_coeffs, smooth_b_coeffs])
+    }
+    logger.debug(
+        "shapes x: %s, y: %s, t: %s",
+        components[a_label].shape,
+        components[b_label].shape,
+        time.shape,
     )
-    ax[0].plot(time, smooth_component_x, label=a_label)
-    ax[0].plot(time, smooth_component_y, label=b_label)
-    ax[0].set_title(rf"$S_{{{levels}}}$")
-
-    components = {}
-    for l in range(1, levels + 1):
-        components[l] = {}
-        for c, c_coeffs in zip([a_label, b_label], [smooth_a_coeffs, smooth_b_coeffs]):
-            components[l][c] = dwt.reconstruct_signal_component(c_coeffs, wavelet, l)
-            components[l][c] = align_series(time, components[l][c])
-            ax[l].plot(time, components[l][c], label=c)
-            ax[l].set_title(rf"$D_{{{levels + 1 - l}}}$")
+
+    ## One plot call per axis for both series
+    for l in range(levels + 1):
+        line_a, line_b = ax[l].plot(
+            time, components[a_label][l], time, components[b_label][l]
+        )
+        line_a.set_label(a_label)
+        line_b.set_label(b_label)
+        ax[l].set_title(
+            rf"$S_{{{levels}}}$" if l == 0 else rf"$D_{{{levels + 1 - l}}}$"
+        )
     plt.legend(loc="upper left")
     return fig
 
 
+def plot_pairs(
+    data: pd.DataFrame, fit_regression: bool = PAIRPLOT_REGRESSION
+) -> sns.PairGrid:
+    """Pair plot of all series, with a regression line for each pair only if
+    `fit_regression` (one OLS fit per cell)"""
+    if fit_regression:
+        return sns.pairplot(data, corner=True, kind="reg", plot_kws={"ci": None})
+    return sns.pairplot(
+        data, corner=True, kind="scatter", plot_kws={"s": 4, "alpha": 0.5}
+    )
+
+
+def compare_series_components(
+    data: pd.DataFrame,
+    x_var: str,
+    y_vars: List[str],
+    mother_wavelet: str,
+    date_column: str = "date",
+    **kwargs,
+) -> Dict[str, matplotlib.figure.Figure]:
+    """Compare the components of `x_var` with those of each series in `y_vars`"""
+    t = data[date_column].to_numpy()
+    x_dwt = dwt.DataForDWT(data[x_var].to_numpy(), mother_wavelet)
+    logger.debug("%s mother wavelet %s", x_var, type(x_dwt.mother_wavelet))
+    results_x_dwt = dwt.run_dwt(x_dwt)
+    figs = {}
+    for y_var in y_vars:
+        results_y_dwt = dwt.run_dwt(
+            dwt.DataForDWT(data[y_var].to_numpy(), mother_wavelet)
+        )
+        figs[y_var] = plot_compare_components(
+            x_var,
+            y_var,
+            results_x_dwt.coeffs,
+            results_y_dwt.coeffs,
+            t,
+            results_x_dwt.levels,
+            mother_wavelet,
+            **kwargs,
+        )
+    return figs
+
+
 def main() -> None:
     """Run script"""
+    # * Retrieve all series concurrently
+    raw_exp, raw_nondur, raw_dur, raw_save = asyncio.run(
+        retrieve_data.fetch_all(
+            [
+                ("fred", "MICH", {"units": "pc1"}),
+                ("fred", "PCEND", {"units": "pc1"}),
+                ("fred", "PCEDG", {"units": "pc1"}),
+                ("fred", "PSAVERT", {"units": "pc1"}),
+            ]
+        )
+    )
+
     # * Inflation expectations
-    raw_data = retrieve_data.get_fed_data("MICH", units="pc1")
-    inf_exp, _, _ = retrieve_data.clean_fed_data(raw_data)
+    inf_exp, _, _ = retrieve_data.clean_fed_data(raw_exp)
     inf_exp.rename(columns={"value": "expectation"}, inplace=True)
     print("Descriptive stats for inflation expectations")
     print(inf_exp.describe())
 
     # * Non-durables consumption, monthly
-    raw_data = retrieve_data.get_fed_data("PCEND", units="pc1")
-    nondur_consump, _, _ = retrieve_data.clean_fed_data(raw_data)
+    nondur_consump, _, _ = retrieve_data.clean_fed_data(raw_nondur)
     nondur_consump.rename(columns={"value": "nondurable"}, inplace=True)
     print("Descriptive stats for personal non-durables consumption")
     print(nondur_consump.describe())
 
     # * Durables consumption, monthly
-    raw_data = retrieve_data.get_fed_data("PCEDG", units="pc1")
-    dur_consump, _, _ = retrieve_data.clean_fed_data(raw_data)
+    dur_consump, _, _ = retrieve_data.clean_fed_data(raw_dur)
     dur_consump.rename(columns={"value": "durable"}, inplace=True)
     print("Descriptive stats for personal durables consumption")
     print(dur_consump.describe())
 
     # * Personal savings rate
-    raw_data = retrieve_data.get_fed_data("PSAVERT", units="pc1")
-    save, _, _ = retrieve_data.clean_fed_data(raw_data)
+    save, _, _ = retrieve_data.clean_fed_data(raw_save)
     save.rename(columns={"value": "savings"}, inplace=True)
     print("Descriptive stats for personal savings rate")
     print(save.describe())
 
     # * Merge dataframes to align dates and remove extras
-    df = inf_exp.merge(nondur_consump, how="left")
-    df = df.merge(dur_consump, how="left")
-    df = df.merge(save, how="left")
+    df = combine_series(
+        [inf_exp, nondur_consump, dur_consump, save],
+        how="inner",
+        validate="one_to_one",
+    )
     print(
         f"""Inflation expectations observations: {len(inf_exp)}, \n
         Non-durables consumption observations: {len(nondur_consump)}, \n
@@ -194,22 +304,7 @@ def main() -> None:
     print("--------------------------Descriptive stats--------------------------\n")
     print(df.describe())
 
-    sns.pairplot(df, corner=True, kind="reg", plot_kws={"ci": None})
-
-    # * Wavelet decomposition
-    t = df["date"].to_numpy()
-
-    ## Create objects for DWT
-    exp_dwt = dwt.DataForDWT(df["expectation"].to_numpy(), MOTHER)
-    nondur_consump_dwt = dwt.DataForDWT(df["nondurable"].to_numpy(), MOTHER)
-    dur_consump_dwt = dwt.DataForDWT(df["durable"].to_numpy(), MOTHER)
-    save_dwt = dwt.DataForDWT(df["savings"].to_numpy(), MOTHER)
-
-    logger.debug("exp mother wavelet %s", type(exp_dwt.mother_wavelet))
-    results_exp_dwt = dwt.run_dwt(exp_dwt)
-    results_nondur_consump_dwt = dwt.run_dwt(nondur_consump_dwt)
-    results_dur_consump_dwt = dwt.run_dwt(dur_consump_dwt)
-    results_save_dwt = dwt.run_dwt(save_dwt)
+    _ = plot_pairs(df)
 
     df_melt = pd.melt(df, ["date"])
     df_melt.rename(columns={"value": "%"}, inplace=True)
@@ -221,36 +316,11 @@ def main() -> None:
     ax.set_yscale("log")
     sns.kdeplot(data=df_melt, x="%", hue="variable", ax=ax)
 
-    # * Plot each series component separately
-    _ = plot_compare_components(
-        "expectation",
-        "nondurable",
-        results_exp_dwt.coeffs,
-        results_nondur_consump_dwt.coeffs,
-        t,
-        results_exp_dwt.levels,
-        MOTHER,
-        figsize=(15, 10),
-    )
-
-    _ = plot_compare_components(
-        "expectation",
-        "durable",
-        results_exp_dwt.coeffs,
-        results_dur_consump_dwt.coeffs,
-        t,
-        results_exp_dwt.levels,
-        MOTHER,
-        figsize=(15, 10),
-    )
-
-    _ = plot_compare_components(
+    # * Wavelet decomposition, plotting each series component separately
+    _ = compare_series_components(
+        df,
         "expectation",
-        "savings",
-        results_exp_dwt.coeffs,
-        results_save_dwt.coeffs,
-        t,
-        results_exp_dwt.levels,
+        ["nondurable", "durable", "savings"],
         MOTHER,
         figsize=(15, 10),
     )
@@ -1,21 +1,28 @@
 """Retrieve data for analysis via API from statistics agencies and central banks"""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import json
 import os
+from pathlib import Path
 import sys
+from typing import Iterator, Union
 
+import aiohttp
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
-import numpy as np
+import lxml.etree as ET
 import numpy.typing as npt
+import orjson
 import pandas as pd
-import seaborn as sns
+import pyarrow as pa
+import pyarrow.compute as pc
 import requests
-import xmltodict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from constants import ids
-from src.helpers import convert_column_to_real_value
+from src.cache import FileCache
+from src.helpers import combine_series, convert_column_to_real_value
 from src.logging_helpers import define_other_module_log_level
 
 # * Logging settings
@@ -33,7 +40,64 @@ INSEE_AUTH = os.getenv("INSEE_AUTH")
 # * Define constant currency years
 CONSTANT_DOLLAR_DATE = "2017-12-01"
 
+# * API endpoints
+FED_URL = "https://api.stlouisfed.org/fred/series/observations"
+INSEE_URL = "https://api.insee.fr/series/BDM/V1/data/SERIES_BDM/"
+
+# * Compressed responses (brotli if available, otherwise gzip)
+ACCEPT_ENCODING = "br, gzip"
+FED_HEADERS = {"Accept": "application/json", "Accept-Encoding": ACCEPT_ENCODING}
+
+# * Concurrent requests settings
+MAX_CONNECTIONS = 8
+ASYNC_TIMEOUT = 10
+
+# * Shared HTTP session (keep-alive connections reused across requests)
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=0.3),
+    ),
+)
+
+# * Streamed INSEE SDMX parsing
+INSEE_EVENTS = ("start", "end")
+INSEE_TAGS = ("{*}Series", "{*}Obs")
+INSEE_CHUNK_SIZE = 64 * 1024
+
+# * Response cache (series are monthly, so refresh at most once a day)
+CACHE_DIR = Path(__file__).parents[1] / ".cache"
+CACHE_TTL_DAYS = 1
+cache = FileCache(CACHE_DIR)
+
+# * Series values have at most a few significant digits, so single precision is enough
+VALUE_DTYPE = "float32"
+## Anything else (e.g. FRED's "." for missing observations) is parsed as null
+NUMERIC_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+
+def define_fed_params(series: str, **kwargs) -> dict:
+    """Create FRED request parameters for series with optional `units` and `freq`"""
+    units = kwargs.get("units", None)
+    freq = kwargs.get("freq", None)
+
+    ## Request parameters
+    params = {
+        "api_key": FED_KEY,
+        "series_id": series,
+        "units": units,
+        "freq": freq,
+        "file_type": "json",
+    }
 
+    ## Remove parameters with None
+    return {k: v for k, v in params.items() if v is not None}
+
+
+@cache.cached(endpoint="fred", ttl_days=CACHE_TTL_DAYS)
 def get_fed_data(series: str, no_headers: bool = True, **kwargs) -> str:
     """Retrieve data series from FRED database and convert to time series if desired
     Some series codes:
@@ -55,32 +119,15 @@ def get_fed_data(series: str, no_headers: bool = True, **kwargs) -> str:
     """
 
     ## API GET request
-    base_url = "https://api.stlouisfed.org/fred/series/observations"
-
-    units = kwargs.get("units", None)
-    freq = kwargs.get("freq", None)
-
-    ## Request parameters
-    params = {
-        "api_key": FED_KEY,
-        "series_id": series,
-        "units": units,
-        "freq": freq,
-        "file_type": "json",
-    }
-
-    ## Remove parameters with None
-    params = {k: v for k, v in params.items() if v is not None}
-
-    ## Create final url for request
-    final_url = f"{base_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
+    params = define_fed_params(series, **kwargs)
 
     ## Make request
     try:
         print(f"Requesting {series}")
-        r = requests.get(final_url, timeout=5)
+        r = SESSION.get(FED_URL, params=params, headers=FED_HEADERS, timeout=5)
         r.raise_for_status()  # Raise an exception for 4XX and 5XX HTTP status codes
-        resource = r.json()["observations"] if no_headers is True else r.json()
+        response = orjson.loads(r.content)
+        resource = response["observations"] if no_headers is True else response
         print(f"Retrieved {series}")
         return resource
     except requests.Timeout:
@@ -89,23 +136,105 @@ def get_fed_data(series: str, no_headers: bool = True, **kwargs) -> str:
     except requests.RequestException as e:
         print(f"Request error: {e}")
         return None
+    except orjson.JSONDecodeError as e:
+        print(f"Request error: {e}")
+        return None
 
 
-def clean_fed_data(json_data: str) -> tuple[pd.DataFrame, npt.NDArray, npt.NDArray]:
-    """Convert Fed data to time and endogenous variables (t, y)"""
+@cache.cached(endpoint="fred", ttl_days=CACHE_TTL_DAYS)
+async def aget_fed_data(
+    session: aiohttp.ClientSession, series: str, no_headers: bool = True, **kwargs
+) -> str:
+    """Asynchronous version of `get_fed_data` sharing `session`'s connection pool"""
+    params = define_fed_params(series, **kwargs)
 
-    ## Convert to dataframe
-    df = pd.DataFrame(json_data)
-    print(df.info(verbose=True), "\n")
+    ## Make request
+    try:
+        print(f"Requesting {series}")
+        async with session.get(
+            FED_URL,
+            params=params,
+            headers=FED_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT),
+        ) as r:
+            r.raise_for_status()  # Raise an exception for 4XX and 5XX HTTP status codes
+            response = orjson.loads(await r.read())
+        resource = response["observations"] if no_headers is True else response
+        print(f"Retrieved {series}")
+        return resource
+    except asyncio.TimeoutError:
+        print("Timeout error: The request took too long to complete.")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"Request error: {e}")
+        return None
+    except orjson.JSONDecodeError as e:
+        print(f"Request error: {e}")
+        return None
 
-    ## Convert dtypes
-    df.replace(".", np.nan, inplace=True)
-    df.dropna(inplace=True)
-    df["value"] = pd.to_numeric(df["value"])
-    df["date"] = pd.to_datetime(df["date"])
 
-    ## Drop extra columns
-    df = df[["date", "value"]]
+def convert_observations(
+    records: list,
+    date_field: str,
+    value_field: str,
+    date_format: Union[str, None] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Build dataframe from list of observation dicts, converting `value_field` to
+    `VALUE_DTYPE` and `date_field` to datetime in Arrow compute kernels\n
+    Records may omit fields or mix numeric and string values: every field is read
+    as text with an explicit schema, so values are stripped and anything
+    non-numeric (e.g. FRED's `"."`) becomes missing.\n
+    Dates are parsed with `date_format` if given, otherwise with
+    `pd.to_datetime(**kwargs)` (for period formats Arrow can't parse)"""
+    ## Union of fields across records (not only the first), all read as strings
+    fields = list(dict.fromkeys(k for record in records for k in record))
+    fields += [f for f in (date_field, value_field) if f not in fields]
+    table = pa.Table.from_pylist(
+        [
+            {k: None if v is None else str(v) for k, v in record.items()}
+            for record in records
+        ],
+        schema=pa.schema([(f, pa.string()) for f in fields]),
+    )
+
+    values = pc.utf8_trim_whitespace(table[value_field])
+    is_numeric = pc.match_substring_regex(values, NUMERIC_PATTERN)
+    dropped = pc.sum(pc.invert(pc.fill_null(is_numeric, True))).as_py() or 0
+    if dropped:
+        logger.debug("%s non-numeric %s entries set to missing", dropped, value_field)
+    values = pc.if_else(is_numeric, values, pa.scalar(None, pa.string()))
+    table = table.set_column(
+        table.schema.get_field_index(value_field),
+        value_field,
+        pc.cast(values, pa.from_numpy_dtype(VALUE_DTYPE)),
+    )
+    if date_format is not None:
+        table = table.set_column(
+            table.schema.get_field_index(date_field),
+            date_field,
+            pc.strptime(table[date_field], format=date_format, unit="ns"),
+        )
+
+    df = table.to_pandas()
+    if date_format is None:
+        df[date_field] = pd.to_datetime(df[date_field], cache=True, **kwargs)
+    return df
+
+
+def clean_fed_data(
+    json_data: Union[list, dict], verbose: bool = False
+) -> tuple[pd.DataFrame, npt.NDArray, npt.NDArray]:
+    """Convert Fed data to time and endogenous variables (t, y)\n
+    Accepts the observations list or the full response (`no_headers=False`)"""
+    if isinstance(json_data, dict):
+        json_data = json_data["observations"]
+
+    ## Convert to dataframe, keeping only date and value columns
+    df = convert_observations(json_data, "date", "value", date_format="%Y-%m-%d")
+    df = df[["date", "value"]].dropna(subset=["value"])
+    if verbose:
+        print(df.info(verbose=True), "\n")
 
     t = df["date"].to_numpy()
     y = df["value"].to_numpy()
@@ -118,22 +247,24 @@ def catalog_camme() -> tuple[str, str, str]:
     url = "https://api.insee.fr/series/BDM/V1/data/ENQ-CONJ-MENAGES/"
     headers = {
         "Accept": "application/json",
+        "Accept-Encoding": ACCEPT_ENCODING,
         "Authorization": f"Bearer {INSEE_AUTH}",
     }
 
-    response = requests.get(url, headers=headers, timeout=5)
-    decoded_response = response.content.decode("utf-8")
-    response_json = json.loads(json.dumps(xmltodict.parse(decoded_response)))
-    for i in response_json["message:StructureSpecificData"]["message:DataSet"][
-        "Series"
-    ]:
-        if i["@SERIE_ARRETEE"] == "FALSE" and i["@CORRECTION"] == "BRUT":
+    response = SESSION.get(url, headers=headers, timeout=5)
+    root = ET.fromstring(response.content)
+    for series in root.iterfind(".//{*}Series"):
+        if (
+            series.get("SERIE_ARRETEE") == "FALSE"
+            and series.get("CORRECTION") == "BRUT"
+        ):
             print(
-                f"""{i['@INDICATEUR']} : {i['@TITLE_FR']}\n\
-            {i['@IDBANK']}\n"""
+                f"""{series.get('INDICATEUR')} : {series.get('TITLE_FR')}\n\
+            {series.get('IDBANK')}\n"""
             )
 
 
+@cache.cached(endpoint="insee", ttl_days=CACHE_TTL_DAYS)
 def get_insee_data(series_id: str) -> list:
     """
     Retrieve data (Series_BDM) from INSEE API
@@ -148,33 +279,96 @@ def get_insee_data(series_id: str) -> list:
     - 'Household durables consumption' `'011794493'`,
 
     """
-    url = f"https://api.insee.fr/series/BDM/V1/data/SERIES_BDM/{series_id}"
+    url = f"{INSEE_URL}{series_id}"
     headers = {
         "Accept": "application/json",
+        "Accept-Encoding": ACCEPT_ENCODING,
         "Authorization": f"Bearer {INSEE_AUTH}",
     }
-    response = requests.get(url, headers=headers, timeout=10)
-    decoded_response = response.content.decode("utf-8")
-    response_json = json.loads(json.dumps(xmltodict.parse(decoded_response)))
-    series_title = response_json["message:StructureSpecificData"]["message:DataSet"][
-        "Series"
-    ]["@TITLE_FR"]
-    response_data = response_json["message:StructureSpecificData"]["message:DataSet"][
-        "Series"
-    ]["Obs"]
+    response_data = []
+    try:
+        with SESSION.get(url, headers=headers, stream=True, timeout=10) as response:
+            response.raise_for_status()  # Raise an exception for 4XX and 5XX codes
+            ## Let urllib3 undo any gzip transfer encoding before parsing
+            response.raw.decode_content = True
+            series_title = read_insee_events(
+                ET.iterparse(response.raw, events=INSEE_EVENTS, tag=INSEE_TAGS),
+                response_data,
+            )
+    except requests.Timeout:
+        print("Timeout error: The request took too long to complete.")
+        return None
+    except requests.RequestException as e:
+        print(f"Request error: {e}")
+        return None
+    except ET.XMLSyntaxError as e:
+        print(f"Parsing error: {e}")
+        return None
     print(f"Retrieved {series_title}. \n{len(response_data)} observations\n")
 
     return response_data
 
 
+@cache.cached(endpoint="insee", ttl_days=CACHE_TTL_DAYS)
+async def aget_insee_data(session: aiohttp.ClientSession, series_id: str) -> list:
+    """Asynchronous version of `get_insee_data` sharing `session`'s connection pool"""
+    url = f"{INSEE_URL}{series_id}"
+    headers = {
+        "Accept": "application/json",
+        "Accept-Encoding": ACCEPT_ENCODING,
+        "Authorization": f"Bearer {INSEE_AUTH}",
+    }
+    response_data = []
+    series_title = None
+    parser = ET.XMLPullParser(events=INSEE_EVENTS, tag=INSEE_TAGS)
+    try:
+        async with session.get(
+            url, headers=headers, timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT)
+        ) as response:
+            response.raise_for_status()  # Raise an exception for 4XX and 5XX codes
+            async for chunk in response.content.iter_chunked(INSEE_CHUNK_SIZE):
+                parser.feed(chunk)
+                series_title = (
+                    read_insee_events(parser.read_events(), response_data)
+                    or series_title
+                )
+        parser.close()
+    except asyncio.TimeoutError:
+        print("Timeout error: The request took too long to complete.")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"Request error: {e}")
+        return None
+    except ET.XMLSyntaxError as e:
+        print(f"Parsing error: {e}")
+        return None
+    print(f"Retrieved {series_title}. \n{len(response_data)} observations\n")
+
+    return response_data
+
+
+def read_insee_events(events: Iterator, response_data: list) -> Union[str, None]:
+    """Append observation (Obs) attributes from streamed SDMX parser events to
+    `response_data`, discarding each parsed element to keep memory flat.
+    Returns the series title if its opening tag was among `events`"""
+    series_title = None
+    for event, element in events:
+        if event == "start" and ET.QName(element).localname == "Series":
+            series_title = element.get("TITLE_FR")
+        elif event == "end" and ET.QName(element).localname == "Obs":
+            ## Keep xmltodict-style "@" attribute keys expected by `clean_insee_data`
+            response_data.append({f"@{k}": v for k, v in element.attrib.items()})
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    return series_title
+
+
 def clean_insee_data(
     data: list, ascending: bool = True
 ) -> tuple[pd.DataFrame, npt.NDArray, npt.NDArray]:
     """Convert INSEE data to time and endogenous variables (t, y)"""
-    df = pd.DataFrame(data)
-    # Convert data types
-    df["@TIME_PERIOD"] = pd.to_datetime(df["@TIME_PERIOD"])
-    df["@OBS_VALUE"] = df["@OBS_VALUE"].astype(float)
+    df = convert_observations(data, "@TIME_PERIOD", "@OBS_VALUE")
     if ascending is True and df["@TIME_PERIOD"].iloc[-1] < df["@TIME_PERIOD"].iloc[0]:
         df = df[::-1]
     elif (
@@ -190,6 +384,7 @@ def clean_insee_data(
     return df[["date", "value"]], t, y
 
 
+@cache.cached(endpoint="bdf", ttl_days=CACHE_TTL_DAYS)
 def get_bdf_data(series_key: str, dataset: str = "ICP", **kwargs) -> str:
     """Retrieve data from Banque de France API
     Measured inflation: `'ICP.M.FR.N.000000.4.ANR'`
@@ -198,24 +393,16 @@ def get_bdf_data(series_key: str, dataset: str = "ICP", **kwargs) -> str:
     ## API GET request
     data_type = kwargs.get("data_type", "data")
     req_format = kwargs.get("format", "json")
-    headers = {"accept": "application/json"}
+    headers = {"accept": "application/json", "Accept-Encoding": ACCEPT_ENCODING}
 
     base_url = "https://api.webstat.banque-france.fr/webstat-fr/v1/"
 
-    params = {
-        "data_type": data_type,
-        "dataset": dataset,
-        "series_key": series_key,
-    }
-
-    ## Remove parameters with None
-    params = {k: v for k, v in params.items() if v is not None}
-
-    ## Create final url for request
-    final_url = f"{base_url}{'/'.join([f'{v}' for k, v in params.items()])}?client_id={BDF_KEY}&format={req_format}"
+    ## Path segments are fixed as `{data_type}/{dataset}/{series_key}`
+    final_url = f"{base_url}{data_type}/{dataset}/{series_key}"
+    params = {"client_id": BDF_KEY, "format": req_format}
 
     print(f"Requesting {series_key}")
-    r = requests.get(final_url, headers=headers, timeout=5)
+    r = SESSION.get(final_url, params=params, headers=headers, timeout=5)
     print(r)
     response = r.json()
     response = response["seriesObs"][0]["ObservationsSerie"]["observations"]
@@ -227,20 +414,13 @@ def clean_bdf_data(
     data: list, ascending: bool = True
 ) -> tuple[pd.DataFrame, npt.NDArray, npt.NDArray]:
     """Convert list of dicts data from Banque de France to lists for t and y"""
-    ## Dictionary of observations
-    dict_obs = {
-        "periodId": [],
-        "periodFirstDate": [],
-        "periodName": [],
-        "value": [],
-    }
-    for i in data:
-        obs = i["ObservationPeriod"]
-        for k, v in dict_obs.items():
-            v.append(obs[k])
-
-    ## Convert to df
-    df = pd.DataFrame(dict_obs)
+    ## Build dataframe of observations in one pass
+    df = convert_observations(
+        [i["ObservationPeriod"] for i in data],
+        "periodFirstDate",
+        "value",
+        dayfirst=True,
+    )
     if (
         ascending is True
         and df["periodFirstDate"].iloc[-1] < df["periodFirstDate"].iloc[0]
@@ -253,7 +433,6 @@ def clean_bdf_data(
         df = df[::-1]
     else:
         pass
-    df["periodFirstDate"] = pd.to_datetime(df["periodFirstDate"], dayfirst=True)
     df.rename(columns={"periodFirstDate": "date"}, inplace=True)
     t = df["date"].to_numpy()
     y = df["value"].to_numpy()
@@ -269,11 +448,59 @@ def get_world_bank_data(series_id: str, country: str) -> str:
     United States: 'US'
     """
     base_url = f"https://api.worldbank.org/v2/indicator/{series_id}?locations={country}?format=json"
-    response = requests.get(base_url, timeout=5)
+    response = SESSION.get(base_url, timeout=5)
     print(response)
     return response.json()
 
 
+RETRIEVERS = {"fred": get_fed_data, "insee": get_insee_data}
+ASYNC_RETRIEVERS = {"fred": aget_fed_data, "insee": aget_insee_data}
+
+
+async def fetch_all(series_specs: list[tuple[str, str, dict]]) -> list:
+    """Retrieve independent series concurrently over a single client session\n
+    Each spec is `(source, series_id, kwargs)` with `source` in `"fred"`, `"insee"`,
+    e.g. `("fred", "MICH", {"units": "pc1"})`. Results are returned in the order
+    of `series_specs`; a series that fails is returned as None without cancelling
+    the others.\n
+    Run from synchronous code with `asyncio.run(fetch_all(series_specs))`"""
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(
+            *[
+                ASYNC_RETRIEVERS[source](session, series_id, **kwargs)
+                for source, series_id, kwargs in series_specs
+            ],
+            return_exceptions=True,
+        )
+    for (source, series_id, _), result in zip(series_specs, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to retrieve %s %s: %r", source, series_id, result)
+    return [None if isinstance(r, Exception) else r for r in results]
+
+
+def fetch_all_threaded(
+    series_specs: list[tuple[str, str, dict]], max_workers: int = MAX_CONNECTIONS
+) -> list:
+    """Blocking counterpart of `fetch_all`, running each request in a thread pool\n
+    For notebooks, where an event loop is already running and `asyncio.run` fails.
+    Takes the same `(source, series_id, kwargs)` specs and returns results in order,
+    with None for requests that raised"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(RETRIEVERS[source], series_id, **kwargs)
+            for source, series_id, kwargs in series_specs
+        ]
+    results = []
+    for (source, series_id, _), future in zip(series_specs, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error("Failed to retrieve %s %s: %r", source, series_id, e)
+            results.append(None)
+    return results
+
+
 def data_to_time_series(df, index_column, measure=None):
     """Convert dataframe to time series"""
     if measure is not None:
@@ -321,11 +548,7 @@ def main() -> None:
     save.rename(columns={"value": "savings"}, inplace=True)
 
     # * Merge dataframes to align dates and remove extras
-    us_data = cpi.merge(inf, how="left")
-    us_data = us_data.merge(inf_exp, how="left")
-    us_data = us_data.merge(nondur_consump, how="left")
-    us_data = us_data.merge(dur_consump, how="left")
-    us_data = us_data.merge(save, how="left")
+    us_data = combine_series([cpi, inf, inf_exp, nondur_consump, dur_consump, save])
 
     # * Drop NaNs
     us_data.dropna(inplace=True)
@@ -345,6 +568,10 @@ def main() -> None:
     print(us_melt.head())
     print(us_melt.tail())
 
+    ## Plotting libraries are only needed here, so keep module import light
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sns.lineplot(us_melt, x="date", y="value", hue="variable")
     plt.show()
 
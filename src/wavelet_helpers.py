@@ -53,8 +53,7 @@ def normalize_xwt_results(
     """Normalize results for plotting"""
     period = 1 / freqs
     power = (np.abs(xwt_coeffs)) ** 2  ## Normalize wavelet power spectrum
-    sig95 = np.ones([1, signal_size]) * signif[:, None]
-    sig95 = power / sig95  ## Want where power / sig95 > 1
+    sig95 = power / signif[:, None]  ## Want where power / sig95 > 1
     coi_plot = np.concatenate(
         [np.log2(coi), [1e-9], np.log2(period[-1:]), np.log2(period[-1:]), [1e-9]]
     ).clip(
@@ -65,9 +65,11 @@ class DataForXWT:
     delta_j: float
     initial_scale: float
     levels: List[float]
+    log2_levels: npt.NDArray = field(init=False)
 
     def __post_init__(self):
         self.t_values = np.linspace(1, self.y1_values.size + 1, self.y1_values.size)
+        self.log2_levels = np.log2(self.levels)
 
 
 @dataclass
@@ -109,15 +111,14 @@ def run_xwt(
             signal_size,
             xwt_result,
             coi,
-            np.log2(cross_wavelet_transform.levels[2]),
+            cross_wavelet_transform.log2_levels[2],
             freqs,
             signif,
         )
     else:
         period = 1 / freqs
         power = xwt_result
-        sig95 = np.ones([1, signal_size]) * signif[:, None]
-        sig95 = power / sig95  ## Want where power / sig95 > 1
+        sig95 = power / signif[:, None]  ## Want where power / sig95 > 1
         coi_plot = coi
 
     # * Caclulate wavelet coherence
@@ -186,7 +187,7 @@ def plot_xwt(
         xwt_data.t_values,
         np.log2(xwt_results.period),
         np.log2(xwt_results.power),
-        np.log2(xwt_data.levels),
+        xwt_data.log2_levels,
         extend="both",
         cmap=kwargs["cmap"],
         extent=extent,
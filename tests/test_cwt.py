@@ -21,6 +21,21 @@ define_other_module_log_level("warning")
 logger.setLevel(logging.DEBUG)
 logger.addHandler(logging.StreamHandler(sys.stdout))
 
+logger.info("Test transform_signal against pycwt")
+t_synthetic = np.arange(240)
+synthetic = np.sin(2 * np.pi * t_synthetic / 12) + 0.5 * np.sin(
+    2 * np.pi * t_synthetic / 50
+)
+wave, scales, freqs, coi = cwt.transform_signal(
+    synthetic, cwt.DT, cwt.DJ, cwt.S0, cwt.J, cwt.MOTHER
+)
+expected_wave, expected_scales, expected_freqs, expected_coi, _, _ = wavelet.cwt(
+    synthetic, cwt.DT, cwt.DJ, cwt.S0, cwt.J, cwt.MOTHER
+)
+assert np.allclose(wave, expected_wave)
+assert np.allclose(scales, expected_scales) and np.allclose(freqs, expected_freqs)
+assert np.allclose(coi, expected_coi)
+
 MEASURE = "MICH"
 raw_data = retrieve_data.get_fed_data(MEASURE, units="pc1", freqs="m")
 _, t_date, dat = retrieve_data.clean_fed_data(raw_data)
@@ -11,6 +11,7 @@ import numpy as np
 import numpy.typing as npt
 import pandas as pd
 from scipy import stats
+from statsmodels.stats.diagnostic import acorr_ljungbox
 
 from src import descriptive_stats
 from src.logging_helpers import define_other_module_log_level
@@ -51,4 +52,38 @@ results = descriptive_stats.test_normality(
 assert list(results.keys()) == ["x", "y"]
 assert "*" not in results["x"] and "*" in results["y"]
 
+logger.info("Testing Ljung-Box columns against statsmodels")
+
+x = np.column_stack([np.random.normal(size=500), np.cumsum(np.random.normal(size=500))])
+lags = [1, 5, 15]
+test_stats, p_values = descriptive_stats.ljung_box_columns(x, lags)
+assert test_stats.shape == p_values.shape == (len(lags), x.shape[1])
+for i in range(x.shape[1]):
+    expected = acorr_ljungbox(x[:, i], lags=lags)
+    assert np.allclose(test_stats[:, i], expected["lb_stat"])
+    assert np.allclose(p_values[:, i], expected["lb_pvalue"])
+
+logger.info("Testing batch moments against pandas")
+
+df = pd.DataFrame({"x": np.random.normal(size=200), "y": np.random.gamma(2, size=200)})
+df.loc[[3, 50], "x"] = np.nan
+moments = descriptive_stats.batch_moments(df.to_numpy(), list(df.columns))
+expected = {
+    "count": df.count(),
+    "mean": df.mean(),
+    "std": df.std(),
+    "skewness": df.skew(),
+    "kurtosis": df.kurt(),
+}
+for statistic, values in expected.items():
+    for column in df.columns:
+        assert np.isclose(moments[statistic][column], values[column])
+
+logger.info("Testing p value stars at the thresholds")
+
+stars = descriptive_stats.count_p_value_stars(
+    [0.1, 0.05, 0.01, 0.0100001, 0.2], [0.1, 0.05, 0.01]
+)
+assert stars.tolist() == [1, 2, 3, 2, 0]
+
 logger.info("Test complete")
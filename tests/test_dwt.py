@@ -29,6 +29,9 @@ test_signal = list(range(1001))
 print(f"Signal length: {len(test_signal)}")
 trim = dwt.trim_signal(test_signal, test_signal)
 assert len(trim) != len(test_signal)
+assert dwt.trim_signal(test_signal, test_signal, how="begin")[0] == 1
+assert dwt.trim_signal(test_signal, test_signal, how="end")[-1] == 999
+assert len(dwt.trim_signal(test_signal, test_signal, how="none")) == len(test_signal)
 
 raw_data = retrieve_data.get_insee_data("000857179")
 _, t, y = retrieve_data.clean_insee_data(raw_data)
@@ -50,9 +53,7 @@ logger.info("Testing smooth signal with INSEE data")
 # * Apply DWT and smooth signal
 results_from_dwt = dwt.smooth_signal(data_for_dwt)
 assert results_from_dwt.levels is not None
-assert len(
-    results_from_dwt.smoothed_signal_dict[results_from_dwt.levels]["signal"]
-) == len(y)
+assert results_from_dwt.smoothed_signals.shape == (results_from_dwt.levels, len(y))
 logger.info("Test passed")
 
 print("DWT testing complete.")
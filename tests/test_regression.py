@@ -114,7 +114,7 @@ nondur_for_dwt = dwt.DataForDWT(us_data["nondurable"].to_numpy(), mother_wavelet
 results_exp_dwt = dwt.smooth_signal(exp_for_dwt)
 results_nondur_dwt = dwt.smooth_signal(nondur_for_dwt)
 approximations = regression.wavelet_approximation(
-    smooth_t_dict=results_exp_dwt.smoothed_signal_dict,
+    smooth_signals=results_exp_dwt.smoothed_signals,
     original_y=nondur_for_dwt.y_values,
     levels=results_exp_dwt.levels,
 )
@@ -1,12 +1,15 @@
 """Test data retrieval functions"""
 
 # %%
+import json
 import logging
 import sys
+import tempfile
 
 import numpy as np
 import pandas as pd
 
+from src.cache import FileCache
 from src.logging_helpers import define_other_module_log_level
 from constants import ids
 from src import retrieve_data
@@ -27,6 +30,94 @@ CPI_T = 200
 CPI_CONSTANT = 100
 CONSTANT_DOLLAR_DATE = "2017-12-01"
 
+# %%
+logger.info("Testing convert_observations, missing value in first record")
+df = retrieve_data.convert_observations(
+    [{"@TIME_PERIOD": "2020-01"}, {"@TIME_PERIOD": "2020-02", "@OBS_VALUE": "1.5"}],
+    "@TIME_PERIOD",
+    "@OBS_VALUE",
+)
+assert np.isnan(df["@OBS_VALUE"].iat[0]) and df["@OBS_VALUE"].iat[1] == 1.5
+
+logger.info("Testing convert_observations, mixed value types")
+df = retrieve_data.convert_observations(
+    [
+        {"date": "2020-01-01", "value": 1.5},
+        {"date": "2020-02-01", "value": " 2.5"},
+        {"date": "2020-03-01", "value": "."},
+    ],
+    "date",
+    "value",
+    date_format="%Y-%m-%d",
+)
+assert df["value"].iloc[:2].tolist() == [1.5, 2.5] and np.isnan(df["value"].iat[2])
+assert df["date"].iat[2] == pd.Timestamp("2020-03-01")
+
+# %%
+logger.info("Testing FileCache, miss, hit and lossless round trip")
+cache_dir = tempfile.TemporaryDirectory()
+file_cache = FileCache(cache_dir.name)
+records = [
+    {"@T": "2020", "@OBS_VALUE": "1", "period": {"start": "2020-01-01"}},
+    {"@T": "2021", "@OBS_VALUE": 1.5},
+    {"@T": "2022"},
+]
+assert file_cache.load("test", {"id": "a"}, ttl_days=1) is None
+file_cache.store("test", {"id": "a"}, records)
+assert file_cache.load("test", {"id": "a"}, ttl_days=1) == records
+assert file_cache.load("test", {"id": "b"}, ttl_days=1) is None
+
+logger.info("Testing FileCache, TTL expiry")
+_, meta_path = file_cache.define_paths("test", {"id": "a"})
+with open(meta_path, "w", encoding="utf-8") as f:
+    json.dump({"fetched": "2000-01-01T00:00:00", "params": {"id": "a"}}, f)
+assert file_cache.load("test", {"id": "a"}, ttl_days=1) is None
+
+logger.info("Testing FileCache, unreadable entry treated as a miss")
+with open(meta_path, "w", encoding="utf-8") as f:
+    f.write("not json")
+assert file_cache.load("test", {"id": "a"}, ttl_days=1) is None
+
+logger.info("Testing FileCache, failed write leaves no entry")
+file_cache.store("test", {"id": "c"}, [{"value": {1, 2}}])
+assert file_cache.load("test", {"id": "c"}, ttl_days=1) is None
+
+logger.info("Testing FileCache, decorator and invalidate=True")
+calls = []
+
+
+@file_cache.cached("decorated")
+def fetch_records(series_id, session=None, **kwargs):
+    """Stand-in retrieval function counting its calls"""
+    calls.append(series_id)
+    return [{"id": series_id, **kwargs}]
+
+
+assert fetch_records("x", freq="m") == [{"id": "x", "freq": "m"}]
+assert fetch_records("x", session=object(), freq="m") == [{"id": "x", "freq": "m"}]
+assert len(calls) == 1
+fetch_records("x", freq="m", invalidate=True)
+assert len(calls) == 2
+fetch_records("x", freq="q")
+assert len(calls) == 3
+
+logger.info("Testing FileCache, None and dict responses not stored")
+
+
+@file_cache.cached("uncacheable")
+def fetch_uncacheable(response):
+    """Stand-in retrieval function returning a failed or non-tabular response"""
+    calls.append(response)
+    return {"error": 1} if response == "dict" else None
+
+
+for response in ["none", "dict"]:
+    calls.clear()
+    fetch_uncacheable(response)
+    fetch_uncacheable(response)
+    assert len(calls) == 2
+cache_dir.cleanup()
+
 # %%
 logger.info("Testing get_fed_data, cleaned data")
 data = retrieve_data.get_fed_data(ids.US_CPI, freq="m")